@@ -0,0 +1,9 @@
+"""Benchmarks for the lexer, the parse engines and class construction
+
+    python -m benchmarks.run --size 20000 --output before.json
+    ... change something ...
+    python -m benchmarks.run --size 20000 --compare before.json
+
+grammars has the parsers we time, corpus makes inputs for them of a
+given size, and run measures and reports (as JSON).
+"""
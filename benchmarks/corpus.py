@@ -0,0 +1,116 @@
+"""Synthetic inputs for the benchmark grammars
+
+Each generator takes a rough size in tokens and a seed, and returns
+a string.  The same size and seed always give the same text.
+"""
+
+import random
+
+def arithmetic(size,seed=0):
+    "Statements of expressions, about size tokens in all"
+    rnd = random.Random(seed)
+    out = []
+    while len(out) < size:
+        depth = 0
+        for i in xrange(rnd.randint(1,15)):
+            if i: out.append(rnd.choice('+-*/'))
+            while depth < 5 and rnd.random() < 0.1:
+                out.append('(')
+                depth += 1
+            r = rnd.random()
+            if r < 0.5:
+                out.append(str(rnd.randint(0,100000)))
+            elif r < 0.9:
+                out.append(rnd.choice(('x','y','alpha','beta_2','total')))
+            else:
+                out.append('-%d'%rnd.randint(0,9))
+            while depth and rnd.random() < 0.2:
+                out.append(')')
+                depth -= 1
+        out.append(')'*depth+';\n')
+    return ' '.join(out)
+
+def json(size,seed=0):
+    "A JSON document of about size tokens"
+    rnd = random.Random(seed)
+    out = []
+    count = [0]
+    def value(depth):
+        r = rnd.random()
+        if depth < 6 and r < 0.3:
+            keys = rnd.randint(1,6)
+            out.append('{')
+            for k in xrange(keys):
+                if k: out.append(',')
+                out.append('"key%d": '%rnd.randint(0,50))
+                value(depth+1)
+                count[0] += 3
+            out.append('}\n')
+            count[0] += 2
+        elif depth < 6 and r < 0.45:
+            items = rnd.randint(0,6)
+            out.append('[')
+            for k in xrange(items):
+                if k: out.append(', ')
+                value(depth+1)
+                count[0] += 1
+            out.append(']')
+            count[0] += 2
+        elif r < 0.7:
+            out.append('"%s"'%rnd.choice(('text','a \\"quoted\\" word','','x'*20)))
+            count[0] += 1
+        elif r < 0.9:
+            out.append(rnd.choice(('0','-12','3.25','6.02e23','100000')))
+            count[0] += 1
+        else:
+            out.append(rnd.choice(('true','false','null')))
+            count[0] += 1
+        return
+    out.append('[')
+    first = True
+    while count[0] < size:
+        if not first: out.append(',\n')
+        first = False
+        value(0)
+        count[0] += 1
+    out.append(']\n')
+    return ''.join(out)
+
+def config(size,seed=0):
+    "A configuration file of about size tokens"
+    rnd = random.Random(seed)
+    out = []
+    count = [0]
+    def items(depth,indent):
+        for i in xrange(rnd.randint(1,8)):
+            r = rnd.random()
+            if depth < 4 and r < 0.15:
+                out.append('%ssection s%d {\n'%(indent,rnd.randint(0,99)))
+                items(depth+1,indent+'  ')
+                out.append('%s}\n'%indent)
+                count[0] += 4
+            elif r < 0.2:
+                out.append('%sinclude "other%d.conf";\n'%(indent,rnd.randint(0,9)))
+                count[0] += 3
+            else:
+                values = [rnd.choice(('1','"on"','local.host','8080','"a b c"'))
+                          for _ in xrange(rnd.randint(1,4))]
+                out.append('%soption%d = %s;'%(indent,i,', '.join(values)))
+                if rnd.random() < 0.3:
+                    out.append('  // a comment')
+                out.append('\n')
+                if rnd.random() < 0.05:
+                    out.append('%s/* a longer\n%s   comment */\n'%(indent,indent))
+                count[0] += 2*len(values)+2
+            if count[0] >= size and not depth: return
+        return
+    while count[0] < size:
+        items(0,'')
+    return ''.join(out)
+
+corpora = {
+    'arithmetic' : arithmetic,
+    'precedence' : arithmetic,
+    'json' : json,
+    'config' : config,
+    }
@@ -0,0 +1,119 @@
+"""The grammars we benchmark
+
+Each is made by a function taking the parse engine, so building the
+class can be timed too.  The classes don't use the table cache.
+"""
+
+import re
+from llparsing import Parser,sequence,operators,WhiteSpace,CxxComment
+
+def arithmetic(engine='recursive'):
+    "Statements of expressions with + - * / and parentheses"
+    class Arithmetic(Parser,WhiteSpace):
+        __engine__ = engine
+        number = re.compile(r'[0-9]+')
+        name = re.compile(r'[a-z_][a-z_0-9]*')
+        plus = '+'; minus = '-'; times = '*'; divide = '/'
+        lparen = '('; rparen = ')'; semi = ';'
+        eof = re.compile(r'$^')
+
+        def start(self,statements,eof): return statements
+        @sequence
+        def statements(self,statement): return statement
+        def statement(self,expr,semi): return expr
+        def expr(self,term,etail): return etail(term)
+        def etail(self,plus,term,etail): return lambda x: etail(('+',x,term))
+        def etail_(self,minus,term,etail): return lambda x: etail(('-',x,term))
+        def etail__(self): return lambda x: x
+        def term(self,factor,ttail): return ttail(factor)
+        def ttail(self,times,factor,ttail): return lambda x: ttail(('*',x,factor))
+        def ttail_(self,divide,factor,ttail): return lambda x: ttail(('/',x,factor))
+        def ttail__(self): return lambda x: x
+        def factor(self,number): return int(number.value)
+        def factor_(self,name): return name.value
+        def factor__(self,minus,factor): return ('-',factor)
+        def factor___(self,lparen,expr,rparen): return expr
+    return Arithmetic
+
+def precedence(engine='recursive'):
+    "The arithmetic statements, with the operators declared by precedence"
+    class Precedence(Parser,WhiteSpace):
+        __engine__ = engine
+        number = re.compile(r'[0-9]+')
+        name = re.compile(r'[a-z_][a-z_0-9]*')
+        plus = '+'; minus = '-'; times = '*'; divide = '/'
+        lparen = '('; rparen = ')'; semi = ';'
+        eof = re.compile(r'$^')
+
+        def start(self,statements,eof): return statements
+        @sequence
+        def statements(self,statement): return statement
+        def statement(self,expr,semi): return expr
+        @operators(plus=1,minus=1,times=2,divide=2)
+        def expr(self,factor,op,factor_): return (op.value,factor,factor_)
+        def factor(self,number): return int(number.value)
+        def factor_(self,name): return name.value
+        def factor__(self,minus,factor): return ('-',factor)
+        def factor___(self,lparen,expr,rparen): return expr
+    return Precedence
+
+def json(engine='recursive'):
+    "JSON-like data: objects, arrays, strings, numbers and constants"
+    class Json(Parser,WhiteSpace):
+        __engine__ = engine
+        string = re.compile(r'"(?:[^"\\]|\\.)*"')
+        number = re.compile(r'-?[0-9]+(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?')
+        true = 'true'; false = 'false'; null = 'null'
+        lbrace = '{'; rbrace = '}'; lbracket = '['; rbracket = ']'
+        comma = ','; colon = ':'
+        eof = re.compile(r'$^')
+
+        def start(self,value,eof): return value
+        def value(self,string): return string.value[1:-1]
+        def value_(self,number): return float(number.value)
+        def value__(self,true): return True
+        def value___(self,false): return False
+        def value____(self,null): return None
+        def value_____(self,lbrace,members,rbrace): return members
+        def value______(self,lbracket,elements,rbracket): return elements
+        def members(self,pairs): return dict(pairs[::2])
+        def members_(self): return {}
+        @sequence
+        def pairs(self,pair,comma): return pair
+        def pair(self,string,colon,value): return string.value[1:-1],value
+        def elements(self,values): return values[::2]
+        def elements_(self): return []
+        @sequence
+        def values(self,value,comma): return value
+    return Json
+
+def config(engine='recursive'):
+    "A configuration language of sections of settings, with comments"
+    class Config(Parser,WhiteSpace,CxxComment):
+        __engine__ = engine
+        name = re.compile(r'[A-Za-z_][A-Za-z_0-9.]*')
+        number = re.compile(r'[0-9]+')
+        string = re.compile(r'"[^"\n]*"')
+        section = 'section'; include = 'include'
+        lbrace = '{'; rbrace = '}'; equals = '='; semi = ';'; comma = ','
+        eof = re.compile(r'$^')
+
+        def start(self,items,eof): return items
+        @sequence
+        def items(self,item): return item
+        def item(self,section,name,lbrace,items,rbrace): return (name.value,items)
+        def item_(self,include,string,semi): return ('include',string.value[1:-1])
+        def item__(self,name,equals,values,semi): return (name.value,values[::2])
+        @sequence
+        def values(self,value,comma): return value
+        def value(self,number): return int(number.value)
+        def value_(self,string): return string.value[1:-1]
+        def value__(self,name): return name.value
+    return Config
+
+grammars = {
+    'arithmetic' : arithmetic,
+    'precedence' : precedence,
+    'json' : json,
+    'config' : config,
+    }
@@ -0,0 +1,165 @@
+"""Run the benchmarks and report the results as JSON
+
+    python -m benchmarks.run [--size N] [--repeat N] [--grammar NAME]
+                             [--engine NAME] [--output FILE] [--compare FILE]
+
+For each grammar we time building the class (with each parse engine),
+lexing its corpus with each lexer engine (tokens/second) and parsing
+it with each parse engine (symbols/second, where symbols are the
+tokens matched plus the non-terminals expanded).  Times are the best
+of --repeat runs.  The peak memory of a parse is measured in a fresh
+interpreter, so memory freed by earlier work in this process can't
+hide any of it, as the peak resident size of a forked child that
+parses over an idle child's.
+
+The JSON report maps names like parse/json/iterative to results.
+--compare prints how the times changed against an earlier report.
+"""
+
+import sys,os,argparse,json,subprocess
+from timeit import default_timer
+from llparsing.lexer import Lexer
+from llparsing.engine import engines
+from llparsing import incremental
+from grammars import grammars
+from corpus import corpora
+
+# Bumped when the report changes in a way that matters to --compare
+version = 1
+
+def best(f,repeat):
+    "The shortest time of several runs of f"
+    times = []
+    for _ in xrange(repeat):
+        start = default_timer()
+        f()
+        times.append(default_timer()-start)
+    return min(times)
+
+def peak_memory(name,engine,size,seed):
+    "The peak memory (in kB) a parse uses, or None if we can't tell"
+    try:
+        output = subprocess.check_output([sys.executable,'-m','benchmarks.run',
+                                          '--peak','%s/%s'%(name,engine),
+                                          '--size',str(size),'--seed',str(seed)])
+    except (OSError,subprocess.CalledProcessError):
+        return None
+    return json.loads(output)
+
+def parse_growth(name,engine,size,seed):
+    "The peak memory (in kB) a parse uses, measured from this process"
+    if not hasattr(os,'fork'): return None
+    def child(g):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                g()
+            finally:
+                os._exit(0)
+        _,_,usage = os.wait4(pid,0)
+        return usage.ru_maxrss
+    cls = grammars[name](engine)
+    source = corpora[name](size,seed)
+    return max(child(lambda: cls().__parse__(source))-child(lambda: None),0)
+
+def count_tokens(cls,source):
+    "The number of tokens the lexer makes of source (before eof)"
+    n = 0
+    eof = cls.__eof__
+    for token in cls.__lexer__(source):
+        if token.flavor == eof: break
+        n += 1
+    return n
+
+def count_symbols(cls,source):
+    "The number of terminals and non-terminals a parse of source goes through"
+    parse = incremental.parse(cls(),source)
+    return len(parse.tokens)-1+len(parse.spans)
+
+def measure(names,engine_names,size,seed,repeat):
+    results = {}
+    for name in names:
+        make = grammars[name]
+        source = corpora[name](size,seed)
+
+        for engine in engine_names:
+            results['build/%s/%s'%(name,engine)] = {
+                'seconds' : best(lambda: make(engine),repeat),
+                }
+
+        for lexer_engine in Lexer.engines:
+            cls = make()
+            cls.__lexer__.engine = lexer_engine
+            tokens = count_tokens(cls,source)
+            seconds = best(lambda: count_tokens(cls,source),repeat)
+            results['lex/%s/%s'%(name,lexer_engine)] = {
+                'seconds' : seconds,
+                'tokens' : tokens,
+                'tokens_per_second' : tokens/seconds,
+                }
+
+        symbols = count_symbols(make(),source)
+        for engine in engine_names:
+            cls = make(engine)
+            seconds = best(lambda: cls().__parse__(source),repeat)
+            results['parse/%s/%s'%(name,engine)] = {
+                'seconds' : seconds,
+                'symbols' : symbols,
+                'symbols_per_second' : symbols/seconds,
+                'peak_kb' : peak_memory(name,engine,size,seed),
+                }
+    return results
+
+def compare(old,new,out):
+    "Write how the times in new changed from those in old"
+    if old.get('version') != version:
+        out.write('(comparing with a version %s report)\n'%old.get('version'))
+    for key in sorted(set(old['results'])&set(new['results'])):
+        before = old['results'][key]['seconds']
+        after = new['results'][key]['seconds']
+        out.write('%-32s %10.4fs %10.4fs %6.2fx\n'%(key,before,after,after/before))
+    return
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run')
+    parser.add_argument('--size',type=int,default=20000,help='tokens in each corpus')
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--grammar',action='append',choices=sorted(grammars))
+    parser.add_argument('--engine',action='append',choices=sorted(engines))
+    parser.add_argument('--output',help='write the JSON report here')
+    parser.add_argument('--compare',help='an earlier JSON report to compare with')
+    # How peak_memory runs one parse in a fresh interpreter
+    parser.add_argument('--peak',help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.peak:
+        name,engine = args.peak.split('/')
+        json.dump(parse_growth(name,engine,args.size,args.seed),sys.stdout)
+        return 0
+
+    report = {
+        'version' : version,
+        'python' : sys.version.split()[0],
+        'platform' : sys.platform,
+        'size' : args.size,
+        'seed' : args.seed,
+        'results' : measure(args.grammar or sorted(grammars),
+                            args.engine or sorted(engines),
+                            args.size,args.seed,args.repeat),
+        }
+
+    if args.output:
+        with open(args.output,'w') as out:
+            json.dump(report,out,indent=1,sort_keys=True)
+    else:
+        json.dump(report,sys.stdout,indent=1,sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f),report,sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
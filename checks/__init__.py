@@ -0,0 +1,8 @@
+"""Checks too slow or too noisy to run with every change
+
+    python -m checks.chunks
+    python -m checks.threads
+
+Each exits with status 0 if all is well.  They parse the benchmark
+grammars and corpora (see benchmarks).
+"""
@@ -0,0 +1,79 @@
+"""Check that push parsing gives the same result however input is split
+
+    python -m checks.chunks [--size N] [--grammar NAME]
+
+Each corpus is push parsed in two chunks split at every offset, and in
+chunks of 1 to 8 characters, and each result compared with __parse__
+of the whole text.  Besides the benchmark grammars there is arithmetic
+with /* */ comments, where a / may be a terminal or start a comment.
+"""
+
+import sys,random,argparse
+from llparsing import CComment
+from benchmarks import grammars as benchmark_grammars
+from benchmarks import corpus
+
+def commented(engine='recursive'):
+    "The arithmetic statements with /* */ comments between tokens"
+    class Commented(benchmark_grammars.arithmetic(engine),CComment):
+        pass
+    return Commented
+
+def commented_corpus(size,seed=0):
+    "Arithmetic statements with a comment after about one token in five"
+    rnd = random.Random(seed)
+    out = []
+    for word in corpus.arithmetic(size,seed).split(' '):
+        out.append(word)
+        if rnd.random() < 0.2:
+            out.append(rnd.choice(('/* a comment */','/**/','/* 1 / 2 */',
+                                   '/* over\n   two lines * / */')))
+    return ' '.join(out)
+
+grammars = dict(benchmark_grammars.grammars,commented=commented)
+corpora = dict(corpus.corpora,commented=commented_corpus)
+
+def push(cls,chunks):
+    "Push parse chunks, returning the result or the SyntaxError raised"
+    try:
+        parser = cls().__push__()
+        for chunk in chunks:
+            parser.feed(chunk)
+        return parser.close()
+    except SyntaxError,error:
+        return 'SyntaxError: %s'%error
+
+def splits(source):
+    "source in two at each offset, then in chunks of each size up to 8"
+    for i in xrange(len(source)+1):
+        yield 'split at %d'%i,(source[:i],source[i:])
+    for n in xrange(1,9):
+        yield 'chunks of %d'%n,[source[i:i+n] for i in xrange(0,len(source),n)]
+    return
+
+def check(name,size,out):
+    "Write each way of splitting name's corpus that changes the result"
+    cls = grammars[name]('iterative')
+    source = corpora[name](size)
+    expected = cls().__parse__(source)
+    failures = 0
+    for how,chunks in splits(source):
+        got = push(cls,chunks)
+        if got != expected:
+            out.write('%s: %s gives %r\n'%(name,how,got))
+            failures += 1
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m checks.chunks')
+    parser.add_argument('--size',type=int,default=200,help='tokens in each corpus')
+    parser.add_argument('--grammar',action='append',choices=sorted(grammars))
+    args = parser.parse_args(argv)
+    failures = 0
+    for name in args.grammar or sorted(grammars):
+        failures += check(name,args.size,sys.stdout)
+    print '%d failures'%failures
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
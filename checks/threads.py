@@ -0,0 +1,94 @@
+"""Stress the per-call parse state with threads sharing one parser
+
+    python -m checks.threads [--threads N] [--parses N] [--engine NAME]
+
+Several threads parse with the same parser instance at once, with
+the interpreter switching threads as often as it can.  Some inputs
+nest a parse of a quoted sum inside an action, some are syntax
+errors, and the actions check that __current_token__ is their own
+lookahead.  Every result must be right and every error raised.
+"""
+
+import sys,re,random,threading,argparse
+from llparsing import Parser,WhiteSpace
+from llparsing.engine import engines
+
+def summer(engine):
+    "A parser of sums, whose quoted terms are parsed by the same instance"
+    class Sum(Parser,WhiteSpace):
+        __engine__ = engine
+        number = re.compile(r'[0-9]+')
+        plus = '+'
+        quoted = re.compile(r'"[^"]*"')
+        eof = re.compile(r'$^')
+
+        def start(self,expr,eof): return expr
+        def expr(self,term,tail): return term+tail
+        def tail(self,plus,term,tail): return term+tail
+        def tail_(self): return 0
+        def term(self,number):
+            # The lookahead after a number is a plus or the eof
+            token = self.__current_token__
+            if token.flavor not in ('plus','eof'):
+                raise AssertionError('lookahead after a number is %r'%(token,))
+            return int(number.value)
+        def term_(self,quoted):
+            return self.__parse__(quoted.value[1:-1])
+    return Sum
+
+def work(parser,seed,parses,failures):
+    "Parse random sums, adding what goes wrong to failures"
+    rnd = random.Random(seed)
+    try:
+        for _ in xrange(parses):
+            numbers = [rnd.randint(0,99) for _ in xrange(rnd.randint(1,20))]
+            terms = map(str,numbers)
+            if rnd.random() < 0.3:
+                terms.append('"%s"'%' + '.join(terms))
+                numbers *= 2
+            source = ' + '.join(terms)
+            if rnd.random() < 0.1:
+                try:
+                    parser.__parse__(source+' +')
+                    failures.append('no error for %r'%(source+' +'))
+                except SyntaxError:
+                    pass
+                continue
+            got = parser.__parse__(source)
+            if got != sum(numbers):
+                failures.append('%r gives %r'%(source,got))
+    except Exception,error:
+        failures.append(repr(error))
+    return
+
+def check(engine,threads,parses,out):
+    "Write what goes wrong with threads sharing a parser of engine"
+    parser = summer(engine)()
+    failures = []
+    workers = [threading.Thread(target=work,args=(parser,seed,parses,failures))
+               for seed in xrange(threads)]
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
+    for failure in failures:
+        out.write('%s: %s\n'%(engine,failure))
+    return len(failures)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m checks.threads')
+    parser.add_argument('--threads',type=int,default=8)
+    parser.add_argument('--parses',type=int,default=300,help='parses in each thread')
+    parser.add_argument('--engine',action='append',choices=sorted(engines))
+    args = parser.parse_args(argv)
+    interval = sys.getcheckinterval()
+    sys.setcheckinterval(1)
+    try:
+        failures = 0
+        for engine in args.engine or sorted(engines):
+            failures += check(engine,args.threads,args.parses,sys.stdout)
+    finally:
+        sys.setcheckinterval(interval)
+    print '%d failures'%failures
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
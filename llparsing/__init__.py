@@ -6,9 +6,9 @@ this is a huge improvement over two-step methods since you can
 build a tiny grammar and actions all in one step.
 """
 
-from lexer import Lexer,Token
+from lexer import Lexer,Token,Text,TokenArray
 from parser import ParserType,Parser,\
-    sequence,\
+    sequence,operators,\
     WhiteSpace,PoundComment,CComment,CxxComment
 from grammar import Grammar
 from util import AmbiguityError
@@ -0,0 +1,89 @@
+"""Parse many files at once with a pool of worker processes
+
+Parser classes hold bound methods and a Lexer, so rather than send
+the class to the workers, each worker finds it again by module and
+name (rebuilding it once) and parses whole files.  Results come back
+pickled; a file that fails to parse (or whose result won't pickle)
+gives its exception instead of stopping the batch.  An exception that
+won't come back through pickle itself (one whose __init__ takes other
+arguments, say) is sent as a RuntimeError naming it, with the worker's
+traceback as its traceback attribute.
+"""
+
+import sys,traceback
+import cPickle as pickle
+import multiprocessing
+
+def parse_many(cls,paths,workers=None,ordered=True,chunksize=4):
+    """Parse each file in paths, yielding (path,result,error)
+
+    error is None when the parse worked, otherwise the exception it
+    raised (and result is None).  Results come in the order of paths,
+    or as each file finishes if not ordered.  workers defaults to the
+    number of CPUs; with workers=1 we parse in this process."""
+    # Bad arguments fail here, not when the results are first asked for
+    module = sys.modules.get(cls.__module__)
+    if getattr(module,cls.__name__,None) is not cls:
+        raise ValueError('{0} must be a module level class to parse in workers'.format(
+                cls.__name__))
+    if workers is not None and (not isinstance(workers,(int,long)) or workers < 1):
+        raise ValueError('workers must be a positive integer, not {0!r}'.format(workers))
+    if not isinstance(chunksize,(int,long)) or chunksize < 1:
+        raise ValueError('chunksize must be a positive integer, not {0!r}'.format(chunksize))
+    return outcomes(cls,paths,workers,ordered,chunksize)
+
+def outcomes(cls,paths,workers,ordered,chunksize):
+    "The (path,result,error) of each file, for parse_many"
+    if workers == 1:
+        start_worker(cls.__module__,cls.__name__)
+        for path in paths:
+            yield unpack(parse_path(path))
+        return
+
+    pool = multiprocessing.Pool(workers,start_worker,(cls.__module__,cls.__name__))
+    try:
+        if ordered:
+            parsed = pool.imap(parse_path,paths,chunksize)
+        else:
+            parsed = pool.imap_unordered(parse_path,paths,chunksize)
+        for outcome in parsed:
+            yield unpack(outcome)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return
+
+# The parser (instance) in this worker
+worker_parser = None
+
+def start_worker(module,name):
+    "Find (and so build) the parser class in a worker"
+    global worker_parser
+    __import__(module)
+    worker_parser = getattr(sys.modules[module],name)()
+    return
+
+def parse_path(path):
+    "Parse one file, returning (path,pickled result,error)"
+    try:
+        with open(path) as f:
+            result = worker_parser.__parse__(f)
+        return path,pickle.dumps(result,pickle.HIGHEST_PROTOCOL),None
+    except Exception,error:
+        return path,None,portable(error,sys.exc_info()[2])
+
+def portable(error,trace):
+    "error, or a RuntimeError standing in for it if it won't unpickle"
+    try:
+        pickle.loads(pickle.dumps(error,pickle.HIGHEST_PROTOCOL))
+        return error
+    except Exception:
+        stand_in = RuntimeError('{0}: {1}'.format(type(error).__name__,error))
+        stand_in.traceback = ''.join(traceback.format_exception(type(error),error,trace))
+        return stand_in
+
+def unpack(outcome):
+    path,result,error = outcome
+    if error is not None: return path,None,error
+    return path,pickle.loads(result),None
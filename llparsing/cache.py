@@ -0,0 +1,69 @@
+"""An on-disk cache of the tables ParserType builds for a class
+
+A parser class opts in with a __cache__ attribute: a directory name,
+or True for the directory named by $LLPARSING_CACHE (default
+~/.cache/llparsing).  The tables are stored under a hash of every
+method signature and token attribute of the class, so changing any
+of them simply misses the cache and builds (and saves) new tables.
+"""
+
+import os,types,hashlib,tempfile
+import cPickle as pickle
+
+# Bump this when the layout of the saved tables changes
+version = 1
+
+def directory(setting):
+    "The cache directory for a __cache__ setting"
+    if setting is True:
+        return os.environ.get('LLPARSING_CACHE',
+                              os.path.join(os.path.expanduser('~'),'.cache','llparsing'))
+    return setting
+
+def key(T,start_symbol):
+    """A hash of everything in T that goes into its tables
+
+    That is every method's name and arguments and every attribute
+    that could describe a token (strings and compiled patterns),
+    along with the options that change how the tables are built."""
+    material = [version,T.__name__,start_symbol,
+                getattr(T,'__analysis__','worklist'),
+                sorted(getattr(T,'__sequences__',{}).iteritems())]
+    for name in dir(T):
+        if name.startswith('__') and name.endswith('__'): continue
+        value = getattr(T,name)
+        if isinstance(value,types.MethodType):
+            co = value.im_func.func_code
+            material.append((name,'method',co.co_varnames[:co.co_argcount]))
+        elif isinstance(value,basestring):
+            material.append((name,'str',value))
+        elif hasattr(value,'pattern') and hasattr(value,'flags'):
+            material.append((name,'re',value.pattern,value.flags))
+    return hashlib.sha1(repr(material)).hexdigest()
+
+def load(path,key):
+    "The tables saved under key, or None if there are none (or they are broken)"
+    try:
+        with open(os.path.join(path,key+'.pickle'),'rb') as f:
+            tables = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(tables,dict) or tables.get('version') != version:
+        return None
+    return tables
+
+def save(path,key,tables):
+    """Save tables under key
+
+    We write a temporary file and rename it into place so readers
+    never see a partial file.  A cache we can't write is not an error."""
+    tables = dict(tables,version=version)
+    try:
+        if not os.path.isdir(path): os.makedirs(path)
+        fd,temporary = tempfile.mkstemp(dir=path,suffix='.tmp')
+        with os.fdopen(fd,'wb') as f:
+            pickle.dump(tables,f,pickle.HIGHEST_PROTOCOL)
+        os.rename(temporary,os.path.join(path,key+'.pickle'))
+    except (IOError,OSError):
+        return False
+    return True
@@ -0,0 +1,236 @@
+"""Generate specialized Python source for a parser class
+
+Rather than interpret __predict_table__, the 'compiled' engine writes
+one function per non-terminal that branches directly on the token
+flavor and calls the action with its arguments.  The same source can
+be saved as a standalone module (see write_module) and named in a
+parser class as __compiled__ to skip the grammar analysis entirely.
+"""
+
+def source(cls):
+    "Python source for a module that parses with cls's predict table"
+    table = cls.__predict_table__
+    lines = [
+        '"""Parse functions for {0} generated by llparsing -- do not edit"""'.format(cls.__name__),
+        '',
+        'from llparsing.engine import expected_terminal,no_prediction',
+        '',
+        'start = {0!r}'.format(cls.__grammar__.start),
+        'eof = {0!r}'.format(cls.__eof__),
+        'terminals = frozenset({0!r})'.format(sorted(cls.__terminals__)),
+        'non_terminals = frozenset({0!r})'.format(sorted(table)),
+        '',
+        '# Argument names of every rule, so we can tell if we are stale',
+        'rules = {',
+        ]
+    for label,args in sorted(rules(cls).iteritems()):
+        lines.append('    {0!r} : {1!r},'.format(label,args))
+    lines.append('    }')
+    actions = {}
+    for predictions in table.itervalues():
+        for action,_ in predictions.itervalues():
+            actions[action.__name__] = action
+    lines.append('')
+
+    # And the operator levels, so check can tell if they changed
+    from engine import sequence_loops,operator_climbs
+    climbs = operator_climbs(cls)
+    lines.append('operators = {0!r}'.format(levels(cls)))
+    lines.append('')
+
+    # Each non-terminal lists the flavors it expects (for errors)
+    # and gets a set of flavors for each rule that predicts more
+    # than one.  Sequence bodies are loops (see engine.sequence_loops)
+    loops = sequence_loops(cls)
+    body = []
+    for nt in sorted(table):
+        predictions = table[nt]
+        lines.append('expected_{0} = {1!r}'.format(nt,list(predictions)))
+
+        # An @operators non-terminal climbs by precedence, with
+        # c_{nt} taking an operand and folding in the operators (and
+        # their right operands) that bind at least as tight as least
+        if nt in climbs:
+            operand,_,steps,tail = climbs[nt]
+            lines.append('first_{0} = frozenset({1!r})'.format(nt,sorted(predictions)))
+            lines.append('steps_{0} = {1!r}'.format(nt,steps))
+            lines.append('done_{0} = frozenset({1!r})'.format(nt,sorted(set(table[tail])-set(steps))))
+            body.append('    def p_{0}(self,token,context):'.format(nt))
+            body.append('        if token.flavor not in first_{0}:'.format(nt))
+            body.append('            context.token = token')
+            body.append('            raise no_prediction({0!r},expected_{0},token)'.format(nt))
+            body.extend(fetch(table,operand,'lhs','        '))
+            body.append('        return c_{0}(self,lhs,token,context,0)'.format(nt))
+            body.append('')
+            body.append('    def c_{0}(self,lhs,token,context,least):'.format(nt))
+            body.append('        while 1:')
+            body.append('            step = steps_{0}.get(token.flavor)'.format(nt))
+            body.append('            if step is None:')
+            body.append('                if token.flavor in done_{0}: return lhs,token'.format(nt))
+            body.append('                context.token = token')
+            body.append('                raise no_prediction({0!r},expected_{0},token)'.format(tail))
+            body.append('            if step[0] < least: return lhs,token')
+            body.append('            op = token')
+            body.append('            token = context.next()')
+            body.extend(fetch(table,operand,'rhs','            '))
+            body.append('            after = steps_{0}.get(token.flavor)'.format(nt))
+            body.append('            if after is not None and after[0] >= step[1]:')
+            body.append('                rhs,token = c_{0}(self,rhs,token,context,step[1])'.format(nt))
+            body.append('            context.token = token')
+            body.append('            lhs = binary_{0}(self,lhs,op,rhs)'.format(nt))
+            body.append('')
+            continue
+
+        if nt in loops:
+            element,sep,tail,more = loops[nt]
+            lines.append('first_{0} = frozenset({1!r})'.format(nt,sorted(predictions)))
+            lines.append('more_{0} = frozenset({1!r})'.format(nt,sorted(more)))
+            lines.append('done_{0} = frozenset({1!r})'.format(nt,sorted(set(table[tail])-more)))
+            body.append('    def p_{0}(self,token,context):'.format(nt))
+            body.append('        items = []')
+            body.append('        while 1:')
+            body.append('            if token.flavor not in first_{0}:'.format(nt))
+            body.append('                context.token = token')
+            body.append('                raise no_prediction({0!r},expected_{0},token)'.format(nt))
+            body.extend(fetch(table,element,'a0','            '))
+            body.append('            items.append(a0)')
+            body.append('            if token.flavor not in more_{0}:'.format(nt))
+            body.append('                if token.flavor in done_{0}: return items,token'.format(nt))
+            body.append('                context.token = token')
+            body.append('                raise no_prediction({0!r},expected_{0},token)'.format(tail))
+            if sep is not None:
+                body.extend(fetch(table,sep,'a1','            '))
+                body.append('            items.append(a1)')
+            body.append('')
+            continue
+
+        by_rule = {}
+        for flavor,(action,requires) in predictions.iteritems():
+            by_rule.setdefault(action.__name__,(requires,[]))[1].append(flavor)
+
+        body.append('    def p_{0}(self,token,context):'.format(nt))
+        body.append('        flavor = token.flavor')
+        keyword = 'if'
+        for i,label in enumerate(sorted(by_rule)):
+            requires,flavors = by_rule[label]
+            if len(flavors) == 1:
+                test = 'flavor == {0!r}'.format(flavors[0])
+            else:
+                lines.append('predict_{0}_{1} = frozenset({2!r})'.format(nt,i,sorted(flavors)))
+                test = 'flavor in predict_{0}_{1}'.format(nt,i)
+            body.append('        {0} {1}:'.format(keyword,test))
+            keyword = 'elif'
+
+            args = []
+            for j,sym in enumerate(requires):
+                arg = 'a{0}'.format(j)
+                args.append(arg)
+                # The flavor test already checked a leading terminal
+                # when it is the only one this rule predicts
+                checked = (j == 0 and flavors == [sym])
+                body.extend(fetch(table,sym,arg,'            ',checked))
+            body.append('            context.token = token')
+            body.append('            return action_{0}(self,{1}),token'.format(
+                    label,','.join(args)).replace(',)',')'))
+        body.append('        context.token = token')
+        body.append('        raise no_prediction({0!r},expected_{0},token)'.format(nt))
+        body.append('')
+
+    lines.append('')
+    lines.append('def build(cls):')
+    lines.append('    "The parse function for each non-terminal, calling the actions of cls"')
+    for label in sorted(actions):
+        lines.append('    action_{0} = getattr(cls,{0!r}).im_func'.format(label))
+    for nt in sorted(climbs):
+        lines.append('    binary_{0} = cls.__operators__[{0!r}][3]'.format(nt))
+    lines.append('')
+    lines.extend(body)
+    lines.append('    return {')
+    for nt in sorted(table):
+        lines.append('        {0!r} : p_{0},'.format(nt))
+    lines.append('        }')
+    return '\n'.join(lines)+'\n'
+
+def fetch(table,sym,arg,indent,checked=False):
+    "Source lines that parse sym into variable arg"
+    if sym in table:
+        return [indent+'{0},token = p_{1}(self,token,context)'.format(arg,sym)]
+    lines = []
+    if not checked:
+        lines.append(indent+'if token.flavor != {0!r}:'.format(sym))
+        lines.append(indent+'    context.token = token')
+        lines.append(indent+'    raise expected_terminal({0!r},token)'.format(sym))
+    lines.append(indent+'{0} = token'.format(arg))
+    lines.append(indent+'token = context.next()')
+    return lines
+
+def arguments(method):
+    "The (non-self) argument names of a method"
+    co = method.im_func.func_code
+    return co.co_varnames[1:co.co_argcount]
+
+def rules(cls):
+    "The argument names of each rule (each method not a __name__) of cls"
+    import types
+    result = {}
+    for name in dir(cls):
+        if name.startswith('__') and name.endswith('__'): continue
+        method = getattr(cls,name)
+        if isinstance(method,types.MethodType):
+            result[name] = arguments(method)
+    return result
+
+def write_module(cls,path):
+    "Save the generated source for cls so it can be used as __compiled__"
+    with open(path,'w') as out:
+        out.write(source(cls))
+    return
+
+def load(cls):
+    "Compile and run the generated source for cls as a module namespace"
+    import types
+    module = types.ModuleType('llparsing_{0}'.format(cls.__name__))
+    code = compile(source(cls),'<llparsing {0}>'.format(cls.__name__),'exec')
+    exec code in module.__dict__
+    return module
+
+def levels(cls):
+    "The operator levels of each @operators non-terminal of cls"
+    return dict( (nt,precedences) for nt,(_,_,precedences,_)
+                 in getattr(cls,'__operators__',{}).iteritems() )
+
+def check(cls,module):
+    """Make sure a generated module still matches the rules of cls
+
+    Every rule must be there with the same arguments, and no others,
+    as a rule added since would be missing from the module's tables."""
+    current = rules(cls)
+    for label in sorted(set(current)|set(module.rules)):
+        if current.get(label) != module.rules.get(label):
+            raise RuntimeError('{0} is out of date for {1}.{2}'.format(
+                    module.__name__,cls.__name__,label))
+    if getattr(module,'operators',{}) != levels(cls):
+        raise RuntimeError('{0} is out of date for the operators of {1}'.format(
+                module.__name__,cls.__name__))
+    return
+
+def compiled(cls,module=None):
+    "An engine that runs generated source for the grammar"
+    if module is None: module = load(cls)
+    functions = module.build(cls)
+    terminals = module.terminals
+    from engine import expected_terminal
+    def __predict__(self,symbol,context):
+        token = context.token
+        if symbol in terminals:
+            if token.flavor != symbol:
+                raise expected_terminal(symbol,token)
+            context.token = context.next()
+            return token
+        result,context.token = functions[symbol](self,token,context)
+        return result
+
+    # Python 2 clears the globals of a module that is no longer
+    # referenced, so we hold on to it
+    __predict__.module = module
+    return __predict__
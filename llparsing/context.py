@@ -0,0 +1,76 @@
+"""The state of one parse, kept apart from the parser
+
+A parse keeps its lookahead token in a Context made for that call,
+not on the parser instance or its class's lexer, so one parser can
+parse in many threads at once and an action can start another parse
+(of the same parser or any other).  The engines are passed the
+context where they used to be passed the token stream:
+
+    with Context(parser,parser.__lexer__(source)) as context:
+        return parser.__predict__(start,context)
+
+A context is an iterator over the rest of the tokens too.
+
+Actions still read self.__current_token__, which is the token of the
+innermost parse by self in the calling thread.  Outside a parse it is
+the token the last failed parse stopped at.
+"""
+
+import threading
+
+class Stack(threading.local):
+    "The innermost context of each thread"
+    top = None
+
+stack = Stack()
+
+class Context(object):
+    "The lookahead token and token stream of a parse by parser"
+    __slots__ = ('parser','token','next','outer')
+
+    def __init__(self,parser,tokens=None):
+        self.parser = parser
+        self.outer = None
+        if tokens is None:
+            self.token = None
+        else:
+            self.next = iter(tokens).next
+            self.token = self.next()
+        return
+
+    def __iter__(self):
+        return self
+
+    def __enter__(self):
+        self.outer = stack.top
+        stack.top = self
+        return self
+
+    def __exit__(self,kind,error,traceback):
+        stack.top = self.outer
+        self.outer = None
+        if kind is not None and issubclass(kind,SyntaxError):
+            self.parser.__dict__['__current_token__'] = self.token
+        return False
+
+def current(parser):
+    "The innermost context of parser in this thread, or None"
+    context = stack.top
+    while context is not None and context.parser is not parser:
+        context = context.outer
+    return context
+
+def get_token(parser):
+    context = current(parser)
+    if context is None: return parser.__dict__.get('__current_token__')
+    return context.token
+
+def set_token(parser,token):
+    context = current(parser)
+    if context is None:
+        parser.__dict__['__current_token__'] = token
+    else:
+        context.token = token
+    return
+
+current_token = property(get_token,set_token,doc='The lookahead token (see context)')
@@ -0,0 +1,373 @@
+"""Parse engines that drive a predict table
+
+Each engine builds the __predict__ method for a parser class.  It is
+called as self.__predict__(symbol,context) with context.token holding
+the lookahead token (see context.Context) and returns the action
+result for symbol.
+Pick one with an __engine__ attribute on the parser class.
+"""
+
+from lexer import TokenView
+from codegen import compiled
+
+def expected_terminal(symbol,token):
+    "The SyntaxError for a token that doesn't match terminal symbol"
+    return SyntaxError('{0}:{1}: expected {2}, got {3}\n'.format(
+            token.filename,
+            token.lineno,
+            symbol,
+            token.flavor)
+                       + str(token))
+
+def no_prediction(symbol,predictions,token):
+    "The SyntaxError for a token that non-terminal symbol can't start with"
+    return SyntaxError('{0}:{1}: for {2}, expected {3}, got {4}\n'.format(
+            token.filename,
+            token.lineno,
+            symbol,
+            ' or '.join(predictions),
+            token.flavor)
+                       + str(token))
+
+def sequence_loops(cls):
+    """The @sequence bodies in cls's grammar, which we parse as loops
+
+    Maps each body non-terminal to (element,sep,tail,more).  The
+    element (and sep, if any) repeat while the lookahead is in more,
+    the flavors for which the tail rule asks for another element.
+    Otherwise the lookahead must be one the empty tail predicts."""
+    table = cls.__predict_table__
+    loops = {}
+    for body,(element,sep,tail) in getattr(cls,'__sequences__',{}).iteritems():
+        if body not in table or tail not in table: continue
+        more = frozenset(flavor for flavor,(action,_) in table[tail].iteritems()
+                         if action.__name__ == tail)
+        loops[body] = (element,sep,tail,more)
+    return loops
+
+def operator_climbs(cls):
+    """The @operators non-terminals in cls's grammar, which we parse by climbing
+
+    Maps each non-terminal to (operand,binary,steps,tail) where steps
+    gives each operator's (level,least), least being the lowest
+    level its right operand may hold.  The lookahead after an
+    operand that isn't an operator must be one the tail's empty
+    rule predicts."""
+    table = cls.__predict_table__
+    climbs = {}
+    for symbol,(operand,tail,precedences,binary) in getattr(cls,'__operators__',{}).iteritems():
+        if symbol not in table or tail not in table: continue
+        # A subclass may have replaced the rule with one of its own
+        if any(list(requires) != [operand,tail] for _,requires in table[symbol].itervalues()):
+            continue
+        steps = dict( (flavor,(level,level if right else level+1))
+                      for flavor,(level,right) in precedences.iteritems() )
+        climbs[symbol] = (operand,binary,steps,tail)
+    return climbs
+
+def recursive(cls):
+    "An engine that recurses once per grammar symbol"
+    loops = sequence_loops(cls)
+    climbs = operator_climbs(cls)
+
+    # Fold into lhs the operators (and their right operands) that
+    # bind at least as tight as least.  We only recurse for a right
+    # operand when the operator after it binds tighter
+    def climb(self,entry,lhs,least,context):
+        operand,binary,steps,tail = entry
+        while 1:
+            op = context.token
+            step = steps.get(op.flavor)
+            if step is None:
+                tails = self.__predict_table__[tail]
+                if op.flavor not in tails:
+                    raise no_prediction(tail,tails,op)
+                return lhs
+            if step[0] < least: return lhs
+            context.token = context.next()
+            rhs = self.__predict__(operand,context)
+            after = steps.get(context.token.flavor)
+            if after is not None and after[0] >= step[1]:
+                rhs = climb(self,entry,rhs,step[1],context)
+            lhs = binary(self,lhs,op,rhs)
+
+    def __predict__(self,symbol,context):
+        # Predicting tokens is easy, see if it matches
+        if symbol in self.__terminals__:
+            token = context.token
+            if token.flavor != symbol:
+                raise expected_terminal(symbol,token)
+            context.token = context.next()
+            return token
+
+        # A sequence body appends elements to one list
+        if symbol in loops:
+            element,sep,tail,more = loops[symbol]
+            predictions = self.__predict_table__[symbol]
+            tails = self.__predict_table__[tail]
+            items = []
+            while 1:
+                if context.token.flavor not in predictions:
+                    raise no_prediction(symbol,predictions,context.token)
+                items.append(self.__predict__(element,context))
+                flavor = context.token.flavor
+                if flavor not in more:
+                    if flavor not in tails:
+                        raise no_prediction(tail,tails,context.token)
+                    return items
+                if sep is not None:
+                    items.append(self.__predict__(sep,context))
+
+        # An operator expression climbs by precedence
+        if symbol in climbs:
+            predictions = self.__predict_table__[symbol]
+            if context.token.flavor not in predictions:
+                raise no_prediction(symbol,predictions,context.token)
+            entry = climbs[symbol]
+            return climb(self,entry,self.__predict__(entry[0],context),0,context)
+
+        # For non-terminals, we go to the table
+        predictions = self.__predict_table__[symbol]
+        prediction = predictions.get(context.token.flavor)
+        if prediction is None:
+            raise no_prediction(symbol,predictions,context.token)
+        action,requires = prediction
+        # We unwind much of the predict(predict(predict(...))) here
+        # for readability
+        args = [self.__predict__(sym,context) for sym in requires]
+        return action(self,*args)
+    return __predict__
+
+def iterative(cls):
+    """An engine with an explicit stack instead of recursion
+
+    Each stack entry is a rule being expanded: its action, the
+    symbols it requires and the arguments built so far.  A sequence
+    body gets an entry with no action, its own name and the list of
+    items so far.  Actions are called in the same order and with the
+    same arguments as the recursive engine, but deep inputs don't hit
+    the recursion limit."""
+    terminals = cls.__terminals__
+    table = cls.__predict_table__
+    loops = sequence_loops(cls)
+    def __predict__(self,symbol,context):
+        token = context.token
+
+        if symbol in terminals:
+            if token.flavor != symbol:
+                raise expected_terminal(symbol,token)
+            context.token = context.next()
+            return token
+
+        stack = []
+        while 1:
+            # Expand a non-terminal onto the stack
+            predictions = table[symbol]
+            prediction = predictions.get(token.flavor)
+            if prediction is None:
+                context.token = token
+                raise no_prediction(symbol,predictions,token)
+            if symbol in loops:
+                stack.append((None,symbol,[]))
+            else:
+                action,requires = prediction
+                stack.append((action,requires,[]))
+
+            # Work down the stack until we need another expansion
+            while 1:
+                action,requires,args = stack[-1]
+                n = len(args)
+                if action is not None:
+                    symbol = requires[n] if n < len(requires) else None
+                else:
+                    # requires is the body of a sequence
+                    element,sep,tail,more = loops[requires]
+                    if n == 0:
+                        symbol = element
+                    elif sep is not None and n%2 == 0:
+                        if token.flavor not in table[requires]:
+                            context.token = token
+                            raise no_prediction(requires,table[requires],token)
+                        symbol = element
+                    elif token.flavor in more:
+                        symbol = element if sep is None else sep
+                    elif token.flavor in table[tail]:
+                        symbol = None
+                    else:
+                        context.token = token
+                        raise no_prediction(tail,table[tail],token)
+
+                if symbol is not None:
+                    if symbol not in terminals: break
+                    if token.flavor != symbol:
+                        context.token = token
+                        raise expected_terminal(symbol,token)
+                    args.append(token)
+                    token = context.next()
+                    continue
+
+                # All arguments are in place, so reduce
+                stack.pop()
+                context.token = token
+                value = args if action is None else action(self,*args)
+                if not stack: return value
+                stack[-1][2].append(value)
+
+    return __predict__
+
+class DenseTable(object):
+    """The predict table with its symbols numbered
+
+    Terminals are numbered from 0 (in sorted order), then the
+    non-terminals, so a symbol is a terminal if its code is less
+    than nterminals.  The row for non-terminal code n starts at
+    (n-nterminals)*width in rows, a flat list with a column for each
+    terminal code and a last column for any other flavor.  Each
+    entry is None or (action,requires) with requires as codes."""
+
+    def __init__(self,table,terminals,non_terminals):
+        self.symbols = sorted(terminals)+sorted(non_terminals)
+        self.codes = dict( (symbol,i) for i,symbol in enumerate(self.symbols) )
+        self.nterminals = nterminals = len(terminals)
+        self.width = width = nterminals+1
+        codes = self.codes
+        rows = [None]*(width*len(non_terminals))
+        for symbol,predictions in table.iteritems():
+            row = (codes[symbol]-nterminals)*width
+            for terminal,(action,requires) in predictions.iteritems():
+                rows[row+codes[terminal]] = (action,tuple(codes[sym] for sym in requires))
+        self.rows = rows
+        return
+
+    def row(self,symbol):
+        "The offset in rows of non-terminal symbol's predictions"
+        return (self.codes[symbol]-self.nterminals)*self.width
+
+def dense_table(cls):
+    "cls's DenseTable (None without a predict table), built on first use"
+    try:
+        return cls.__dict__['__dense_table__']
+    except KeyError:
+        pass
+    table = cls.__predict_table__
+    result = None
+    if table is not None:
+        result = DenseTable(table,cls.__terminals__,cls.__non_terminals__)
+    cls.__dense_table__ = result
+    return result
+
+def dense(cls):
+    """The iterative engine on the integer-coded table (see DenseTable)
+
+    Each token's flavor is coded once, as it is read.  The tokens of
+    a TokenArray numbered by our lexer (see Lexer.flavors) already
+    carry their code, so we only look up the flavor of other tokens.
+    After that the engine works with integers and list indexing, and
+    only goes to the string-keyed table to build an error message."""
+    table = cls.__predict_table__
+    coded = dense_table(cls)
+    symbols = coded.symbols
+    codes = coded.codes
+    nterminals = coded.nterminals
+    width = coded.width
+    rows = coded.rows
+    flavor_codes = dict( (flavor,codes[flavor]) for flavor in symbols[:nterminals] )
+
+    # (element,sep,tail row,more) by body code, with sep -1 if there
+    # is none, and more a flag for each flavor code
+    loops = {}
+    for body,(element,sep,tail,more) in sequence_loops(cls).iteritems():
+        flags = [False]*width
+        for flavor in more: flags[codes[flavor]] = True
+        loops[codes[body]] = (codes[element],-1 if sep is None else codes[sep],
+                              coded.row(tail),flags)
+
+    terminals = symbols[:nterminals]
+
+    def __predict__(self,symbol,context):
+        token = context.token
+        # The flavor ids of an array numbered as we code the terminals
+        ids = None
+        if type(token) is TokenView and token.tokens.flavors[:nterminals] == terminals:
+            ids = token.tokens.flavor_ids
+        if ids is None:
+            code = flavor_codes.get(token.flavor,nterminals)
+        else:
+            code = ids[token.index]
+            if code > nterminals: code = nterminals
+        s = codes[symbol]
+
+        if s < nterminals:
+            if code != s:
+                raise expected_terminal(symbol,token)
+            context.token = context.next()
+            return token
+
+        stack = []
+        while 1:
+            # Expand a non-terminal onto the stack
+            prediction = rows[(s-nterminals)*width+code]
+            if prediction is None:
+                context.token = token
+                raise no_prediction(symbols[s],table[symbols[s]],token)
+            if s in loops:
+                stack.append((None,s,[]))
+            else:
+                action,requires = prediction
+                stack.append((action,requires,[]))
+
+            # Work down the stack until we need another expansion
+            while 1:
+                action,requires,args = stack[-1]
+                n = len(args)
+                if action is not None:
+                    s = requires[n] if n < len(requires) else -1
+                else:
+                    # requires is the code of a sequence body
+                    element,sep,tail,more = loops[requires]
+                    if n == 0:
+                        s = element
+                    elif sep >= 0 and n%2 == 0:
+                        if rows[(requires-nterminals)*width+code] is None:
+                            context.token = token
+                            name = symbols[requires]
+                            raise no_prediction(name,table[name],token)
+                        s = element
+                    elif more[code]:
+                        s = element if sep < 0 else sep
+                    elif rows[tail+code] is not None:
+                        s = -1
+                    else:
+                        context.token = token
+                        name = symbols[nterminals+tail//width]
+                        raise no_prediction(name,table[name],token)
+
+                if s >= 0:
+                    if s >= nterminals: break
+                    if code != s:
+                        context.token = token
+                        raise expected_terminal(symbols[s],token)
+                    args.append(token)
+                    token = context.next()
+                    if ids is None:
+                        code = flavor_codes.get(token.flavor,nterminals)
+                    else:
+                        code = ids[token.index]
+                        if code > nterminals: code = nterminals
+                    continue
+
+                # All arguments are in place, so reduce
+                stack.pop()
+                context.token = token
+                value = args if action is None else action(self,*args)
+                if not stack: return value
+                stack[-1][2].append(value)
+
+    return __predict__
+
+engines = {
+    'recursive' : recursive,
+    'iterative' : iterative,
+    'compiled' : compiled,
+    'dense' : dense,
+    }
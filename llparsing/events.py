@@ -0,0 +1,84 @@
+"""A parse as a stream of events, without calling any actions
+
+    for event,value in Calc().__events__('1 + 2'):
+        print event,value
+
+gives ENTER and the non-terminal's name as each expansion starts,
+TOKEN and the token for each terminal matched (the eof included),
+and EXIT and the name as each expansion ends.  A sequence body is
+one expansion, however many elements it has.
+
+The events come from a generator driven by the predict table, which
+keeps only its parse stack, so a consumer can stop at any point and
+memory doesn't grow with the input.
+"""
+
+from engine import expected_terminal,no_prediction,sequence_loops
+
+ENTER = 'enter'
+TOKEN = 'token'
+EXIT = 'exit'
+
+def events(parser,*args,**kwargs):
+    "Lex and parse (as __parse__ does), yielding (event,value) pairs"
+    cls = type(parser)
+    table = cls.__predict_table__
+    if table is None:
+        raise ValueError('{0} has no predict table to make events from'.format(cls.__name__))
+    terminals = cls.__terminals__
+    loops = sequence_loops(cls)
+    stream = iter(parser.__lexer__(*args,**kwargs))
+    token = next(stream)
+
+    # Each stack entry is [non-terminal,requires,n] with n the number
+    # of symbols done.  A sequence body has requires None
+    stack = []
+    symbol = cls.__grammar__.start
+    while 1:
+        # Expand a non-terminal onto the stack
+        predictions = table[symbol]
+        prediction = predictions.get(token.flavor)
+        if prediction is None:
+            parser.__current_token__ = token
+            raise no_prediction(symbol,predictions,token)
+        stack.append([symbol,None if symbol in loops else prediction[1],0])
+        yield ENTER,symbol
+
+        # Work down the stack until we need another expansion
+        while 1:
+            entry = stack[-1]
+            symbol,requires,n = entry
+            if requires is not None:
+                child = requires[n] if n < len(requires) else None
+            else:
+                element,sep,tail,more = loops[symbol]
+                if n == 0:
+                    child = element
+                elif sep is not None and n%2 == 0:
+                    if token.flavor not in table[symbol]:
+                        parser.__current_token__ = token
+                        raise no_prediction(symbol,table[symbol],token)
+                    child = element
+                elif token.flavor in more:
+                    child = element if sep is None else sep
+                elif token.flavor in table[tail]:
+                    child = None
+                else:
+                    parser.__current_token__ = token
+                    raise no_prediction(tail,table[tail],token)
+
+            if child is not None:
+                entry[2] = n+1
+                if child not in terminals:
+                    symbol = child
+                    break
+                if token.flavor != child:
+                    parser.__current_token__ = token
+                    raise expected_terminal(child,token)
+                yield TOKEN,token
+                token = next(stream)
+                continue
+
+            stack.pop()
+            yield EXIT,symbol
+            if not stack: return
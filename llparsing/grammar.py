@@ -22,18 +22,45 @@ class Grammar:
     T = { + id }
     """
 
-    def __init__(self,rules,start='S',actions=None,labels=None):
+    backends = ('worklist','fixpoint')
+
+    def __init__(self,rules,start='S',actions=None,labels=None,backend='worklist'):
         self.__rules = rules
         self.__start = start
         self.__actions = actions or range(len(rules))
         self.__labels = labels or [str(a) for a in self.__actions]
+        if backend not in self.backends:
+            raise ValueError('unknown grammar backend {0!r}'.format(backend))
+        self.__backend = backend
         return
 
+    @property
+    def backend(self):
+        """How we compute derives_lambda, first, follow and predict
+
+        'worklist' (the default) uses a BitsetAnalysis.  'fixpoint'
+        sweeps all the rules until nothing changes."""
+        return self.__backend
+
+    @property
+    def analysis(self):
+        "The BitsetAnalysis the worklist backend uses"
+        try: return self.__analysis
+        except AttributeError: pass
+
+        self.__analysis = BitsetAnalysis(self.rules,self.start,self.NT,self.T)
+        return self.__analysis
+
     @property
     def rules(self):
         "The collection of lhs-> (NT|T)*"
         return self.__rules
 
+    @property
+    def labels(self):
+        "A label (the action's name) for each rule"
+        return self.__labels
+
     @property
     def start(self):
         "The start symbol"
@@ -71,6 +98,10 @@ class Grammar:
         try: return self.__derives_lambda
         except AttributeError: pass
 
+        if self.__backend == 'worklist':
+            self.__derives_lambda = set(self.analysis.nullable)
+            return self.__derives_lambda
+
         derives_lambda = set()
 
         # We keep sweeping through the rules so long as we find updates
@@ -110,6 +141,16 @@ class Grammar:
         try: return self.__first
         except AttributeError: pass
 
+        if self.__backend == 'worklist':
+            analysis = self.analysis
+            self.__first = first = {}
+            for sym in self.NT:
+                first[sym] = analysis.names(analysis.first[sym])
+                if sym in analysis.nullable: first[sym].add(None)
+            for sym in self.T:
+                first[sym] = [sym]
+            return first
+
         # Initialize the first sets of those things that can derive
         # lambda to the set([lambda]), the rest to nothing
         derives_lambda = self.derives_lambda
@@ -146,6 +187,13 @@ class Grammar:
         try: return self.__follow
         except AttributeError: pass
 
+        if self.__backend == 'worklist':
+            analysis = self.analysis
+            self.__follow = follow = dict( (sym,analysis.names(analysis.follow[sym]))
+                                           for sym in self.NT )
+            follow[self.start] = None
+            return follow
+
         # We start with empty follow sets for all NT except
         # the start symbol which can be followed by lambda
         NT = self.NT
@@ -190,12 +238,15 @@ class Grammar:
         follow = self.follow
         actions = self.__actions or range(len(self.rules))
         for i,(lhs,rhs) in enumerate(self.rules):
-            first_i = self.__compute_first(first,rhs)
-            if None in first_i:
-                predict_i = follow[lhs].union(filter(None,first_i))
+            if self.__backend == 'worklist':
+                predict_i = self.analysis.predict(i)
             else:
-                predict_i = first_i
-            for sym in predict_i:
+                first_i = self.__compute_first(first,rhs)
+                if None in first_i:
+                    predict_i = follow[lhs].union(filter(None,first_i))
+                else:
+                    predict_i = first_i
+            for sym in sorted(predict_i):
                 if sym in predict[lhs]:
                     error_msg = 'In rule {i}, "{rule}" {sym} already predicts "{prediction}" for {lhs}'.format(
                         i=i,
@@ -264,9 +315,148 @@ class Grammar:
         for i,(lhs,rhs) in enumerate(self.rules):
             print >>out,'[%d]'%i,lhs,'=>',' '.join(rhs)
         return out.getvalue()
-                    
 
-        
+class BitsetAnalysis:
+    """Worklist FIRST/FOLLOW analysis over integer bitsets
+
+    Terminal i is bit 1<<i.  Rather than re-scan every rule until
+    nothing changes, each set is updated only when a set it depends
+    on changes.  The results are the same as Grammar's fixpoint
+    sweeps: nullable is derives_lambda, and first and follow map
+    each non-terminal to a bitset (lambda is left to nullable)."""
+
+    def __init__(self,rules,start,NT,T):
+        self.rules = rules
+        self.start = start
+        self.terminals = list(T)
+        self.bit = dict( (sym,1<<i) for i,sym in enumerate(self.terminals) )
+
+        # Where each non-terminal is used: (rule index,position)
+        uses = dict( (sym,[]) for sym in NT )
+        for i,(lhs,rhs) in enumerate(rules):
+            for j,sym in enumerate(rhs):
+                if sym in uses: uses[sym].append((i,j))
+
+        self.nullable = self.__nullable(rules,NT,uses)
+        self.__suffixes()
+        self.first = self.__first(rules,NT,uses)
+        self.follow = self.__follow(rules,NT)
+        return
 
+    def __nullable(self,rules,NT,uses):
+        # A rule derives lambda when all its rhs symbols do, so we
+        # count down the symbols that don't (yet)
+        remaining = [len(rhs) for _,rhs in rules]
+        nullable = set()
+        work = [lhs for (lhs,_),n in zip(rules,remaining) if n == 0]
+        while work:
+            sym = work.pop()
+            if sym in nullable: continue
+            nullable.add(sym)
+            for i,_ in uses[sym]:
+                remaining[i] -= 1
+                if remaining[i] == 0: work.append(rules[i][0])
+        return nullable
+
+    def __suffixes(self):
+        # For each rule, whether rhs[j:] is nullable.  We keep the
+        # length of the nullable tail, so rhs[j:] is nullable when
+        # j >= len(rhs)-tail
+        nullable = self.nullable
+        self.tails = tails = []
+        for _,rhs in self.rules:
+            n = 0
+            for sym in reversed(rhs):
+                if sym not in nullable: break
+                n += 1
+            tails.append(n)
+        return
+
+    def __first(self,rules,NT,uses):
+        # first[A] gets the terminals that start A's rules directly,
+        # and first[B] for every B that can start one of them (after
+        # a nullable prefix), so B feeds A
+        nullable = self.nullable
+        bit = self.bit
+        first = dict( (sym,0) for sym in NT )
+        feeds = dict( (sym,set()) for sym in NT )
+        for lhs,rhs in rules:
+            for sym in rhs:
+                if sym in first:
+                    feeds[sym].add(lhs)
+                    if sym in nullable: continue
+                else:
+                    first[lhs] |= bit[sym]
+                break
+
+        work = list(NT)
+        while work:
+            sym = work.pop()
+            bits = first[sym]
+            for lhs in feeds[sym]:
+                if bits & ~first[lhs]:
+                    first[lhs] |= bits
+                    work.append(lhs)
+        return first
 
-    
+    def first_of(self,rhs):
+        "The bitset of terminals that can start rhs (ignoring lambda)"
+        first = self.first
+        nullable = self.nullable
+        bits = 0
+        for sym in rhs:
+            if sym in first:
+                bits |= first[sym]
+                if sym in nullable: continue
+            else:
+                bits |= self.bit[sym]
+            break
+        return bits
+
+    def __follow(self,rules,NT):
+        # follow[B] gets the first of whatever comes after B in a rule,
+        # and follow[A] when the rest of A's rule is nullable, so A
+        # feeds B.  The start symbol's follow is left empty.
+        follow = dict( (sym,0) for sym in NT )
+        feeds = dict( (sym,set()) for sym in NT )
+        tails = self.tails
+        for i,(lhs,rhs) in enumerate(rules):
+            k = len(rhs)
+            after = 0
+            for j in xrange(k-1,-1,-1):
+                sym = rhs[j]
+                if sym in follow:
+                    follow[sym] |= after
+                    if j+1 >= k-tails[i] and lhs != self.start:
+                        feeds[lhs].add(sym)
+                    after = self.first[sym] | (after if sym in self.nullable else 0)
+                else:
+                    after = self.bit[sym]
+
+        work = list(NT)
+        while work:
+            sym = work.pop()
+            bits = follow[sym]
+            for B in feeds[sym]:
+                if bits & ~follow[B]:
+                    follow[B] |= bits
+                    work.append(B)
+        return follow
+
+    def predict(self,i):
+        "The set of terminals that predict rule i"
+        lhs,rhs = self.rules[i]
+        bits = self.first_of(rhs)
+        if self.tails[i] == len(rhs):
+            bits |= self.follow[lhs]
+        return self.names(bits)
+
+    def names(self,bits):
+        "The set of terminal names in a bitset"
+        terminals = self.terminals
+        result = set()
+        while bits:
+            low = bits & -bits
+            result.add(terminals[low.bit_length()-1])
+            bits ^= low
+        return result
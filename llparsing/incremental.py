@@ -0,0 +1,189 @@
+"""Incremental reparsing after small edits
+
+A Parse remembers its tokens and, for every non-terminal it expanded,
+the span of tokens it covered and the action's result.  Parse.edit
+re-lexes from just before the edit until the new tokens line up with
+the old ones again, then reparses, reusing the result of every
+expansion whose tokens (and lookahead token) the edit didn't touch.
+
+    doc = Calc().__incremental__('1 + 2 * 3')
+    doc = doc.edit(4,5,'20')      # replace the 2 with 20
+    print doc.result
+
+The lexing, parsing and action calls an edit takes are proportional
+to the edit (and the depth of the tree around it).  But the tokens
+after the edit are moved, and every span re-indexed, in a pass over
+the whole document, so an edit still takes time linear in its size,
+if much less than a full parse.
+
+Reused results are not recomputed, so actions should depend only on
+their arguments.  Tokens after the edit are moved (their offset and
+text are updated in place), so an edited Parse should no longer be
+used.
+"""
+
+from lexer import Text
+from engine import expected_terminal,no_prediction,sequence_loops
+from context import Context
+
+class Parse(object):
+    """The tokens, result and expansions of one parse of a source
+
+    spans maps (symbol,i) to (value,j): the non-terminal symbol
+    expanded at token i produced value and consumed tokens up to
+    (not including) j, having looked at tokens i through j.  It has
+    every expansion of this parse, and those of the parses it was
+    edited from that the edits left whole (including the ones within
+    a reused expansion, which this parse didn't look into)."""
+
+    def __init__(self,parser,text,tokens,result,spans):
+        self.parser = parser
+        self.text = text
+        self.tokens = tokens
+        self.result = result
+        self.spans = spans
+        return
+
+    @property
+    def source(self):
+        return self.text.source
+
+    def edit(self,start,end,replacement):
+        "A new Parse with source[start:end] replaced"
+        return reparse(self,start,end,replacement)
+
+def parse(parser,source,filename='<string>'):
+    "A Parse of a source string with a parser instance"
+    text = Text(source,getattr(source,'name',filename))
+    tokens = []
+    for token in type(parser).__lexer__.scan(text):
+        tokens.append(token)
+        if token.flavor == type(parser).__eof__: break
+    result,spans = run(parser,tokens,{})
+    return Parse(parser,text,tokens,result,spans)
+
+def reparse(previous,start,end,replacement):
+    "A Parse of previous's source with source[start:end] replaced"
+    parser = previous.parser
+    cls = type(parser)
+    old = previous.tokens
+    source = previous.source
+    new_source = source[:start]+replacement+source[end:]
+    text = Text(new_source,previous.text.filename)
+    delta = len(replacement)-(end-start)
+
+    # We keep the tokens that end before the edit, less one in case
+    # its match could now run longer, and re-lex from the end of
+    # the last one we keep (a token boundary)
+    a = 0
+    while a < len(old) and old[a].offset+len(old[a].value) < start: a += 1
+    a = max(a-1,0)
+    offset = old[a-1].offset+len(old[a-1].value) if a else 0
+
+    # Re-lex until a new token past the edit matches an old one
+    # (at the same moved offset), after which the old tokens hold
+    edited = start+len(replacement)
+    relexed = []
+    m = a
+    b = len(old)
+    for token in cls.__lexer__.scan(text,offset):
+        if token.offset >= edited:
+            while m < len(old) and old[m].offset+delta < token.offset: m += 1
+            if (m < len(old) and old[m].offset+delta == token.offset and
+                old[m].flavor == token.flavor and old[m].value == token.value):
+                b = m
+                break
+        relexed.append(token)
+        if token.flavor == cls.__eof__: break
+
+    for token in old[b:]:
+        token.offset += delta
+        token.text = text
+    tokens = old[:a]+relexed+old[b:]
+
+    # Spans entirely before or after the damaged tokens (counting
+    # their lookahead) are still good, after the index shift
+    shift = len(relexed)-(b-a)
+    reuse = {}
+    for (symbol,i),(value,j) in previous.spans.iteritems():
+        if j < a:
+            reuse[symbol,i] = (value,j)
+        elif i >= b:
+            reuse[symbol,i+shift] = (value,j+shift)
+
+    result,spans = run(parser,tokens,reuse)
+    return Parse(parser,text,tokens,result,spans)
+
+def run(parser,tokens,reuse):
+    """Parse a token list, reusing earlier expansions
+
+    Returns the start symbol's value and the spans of this parse,
+    with every span of reuse kept, as each still holds for its
+    tokens whether or not this parse gets to it."""
+    cls = type(parser)
+    table = cls.__predict_table__
+    if table is None:
+        raise ValueError('{0} has no predict table to reparse with'.format(cls.__name__))
+    terminals = cls.__terminals__
+    loops = sequence_loops(cls)
+    spans = dict(reuse)
+    context = Context(parser)
+
+    # Past the eof token we keep seeing eof, as with the lexer
+    last = len(tokens)-1
+    def at(i):
+        return tokens[i] if i < last else tokens[last]
+
+    def predict(symbol,i):
+        token = at(i)
+        if symbol in terminals:
+            if token.flavor != symbol:
+                context.token = token
+                raise expected_terminal(symbol,token)
+            return token,i+1
+
+        hit = reuse.get((symbol,i))
+        if hit is not None:
+            return hit
+
+        predictions = table[symbol]
+        if symbol in loops:
+            element,sep,tail,more = loops[symbol]
+            tails = table[tail]
+            value = []
+            j = i
+            while 1:
+                if at(j).flavor not in predictions:
+                    context.token = at(j)
+                    raise no_prediction(symbol,predictions,at(j))
+                item,j = predict(element,j)
+                value.append(item)
+                flavor = at(j).flavor
+                if flavor not in more:
+                    if flavor not in tails:
+                        context.token = at(j)
+                        raise no_prediction(tail,tails,at(j))
+                    break
+                if sep is not None:
+                    item,j = predict(sep,j)
+                    value.append(item)
+        else:
+            prediction = predictions.get(token.flavor)
+            if prediction is None:
+                context.token = token
+                raise no_prediction(symbol,predictions,token)
+            action,requires = prediction
+            args = []
+            j = i
+            for sym in requires:
+                arg,j = predict(sym,j)
+                args.append(arg)
+            context.token = at(j)
+            value = action(parser,*args)
+
+        spans[symbol,i] = (value,j)
+        return value,j
+
+    with context:
+        result,_ = predict(cls.__grammar__.start,0)
+    return result,spans
@@ -0,0 +1,143 @@
+"""Counting and timing where parsing spends its time
+
+Set __profile__ = True on a parser class and it gets a Profile in its
+place, which its parses add to:
+
+    class Calc(Parser):
+        __profile__ = True
+        ...
+
+    Calc().__parse__(source)
+    print Calc.__profile__.report()
+
+A profiled class parses with a recursive engine, whatever its
+__engine__ says.  It counts and times each non-terminal expansion
+(less the time in the expansions inside it, but with its tokens and
+action) and each action call.  Its lexer counts, for each pattern,
+the times it was tried (the patterns whose first characters include
+the next character) and the times it matched, and the tokens made of
+each flavor, ignored ones included.  Parses in several threads may
+share a Profile, though counts can then come out a little low.
+
+Classes without __profile__ are built just as before, so profiling
+costs nothing unless it is asked for.
+"""
+
+import threading
+from timeit import default_timer
+from engine import expected_terminal,no_prediction,sequence_loops
+
+class Profile(object):
+    "Counts and times from the parses of one parser class"
+
+    def __init__(self):
+        self.reset()
+        return
+
+    def reset(self):
+        "Forget everything counted so far"
+        # symbol -> [expansions,seconds]
+        self.expansions = {}
+        # method name -> [calls,seconds]
+        self.actions = {}
+        # flavor -> count
+        self.attempts = {}
+        self.matches = {}
+        self.tokens = {}
+        return
+
+    @property
+    def ignored(self):
+        "The number of tokens the lexer skipped"
+        return sum(n for flavor,n in self.tokens.iteritems()
+                   if flavor.startswith('ignore'))
+
+    def report(self,limit=None):
+        "A table of the counts, slowest productions first"
+        lines = []
+        def table(title,counts):
+            lines.append('{0:<32} {1:>10} {2:>12}'.format(title,'count','seconds'))
+            rows = sorted(counts.iteritems(),key=lambda (name,(n,t)): (-t,name))
+            for name,(n,seconds) in rows[:limit]:
+                lines.append('{0:<32} {1:>10} {2:>12.6f}'.format(name,n,seconds))
+            lines.append('')
+            return
+        table('non-terminal',self.expansions)
+        table('action',self.actions)
+
+        lines.append('{0:<32} {1:>10} {2:>10} {3:>10}'.format('pattern','tried','matched','tokens'))
+        rows = sorted(self.attempts.iteritems(),key=lambda (flavor,n): (-n,flavor))
+        for flavor,n in rows[:limit]:
+            lines.append('{0:<32} {1:>10} {2:>10} {3:>10}'.format(
+                    flavor,n,self.matches.get(flavor,0),self.tokens.get(flavor,0)))
+        lines.append('ignored tokens: {0}'.format(self.ignored))
+        return '\n'.join(lines)+'\n'
+
+class Nesting(threading.local):
+    "A stack of the time in inner expansions, for each thread"
+    def __init__(self):
+        self.inner = []
+        return
+
+def profiled(cls,profile):
+    "The recursive engine, counting into profile"
+    loops = sequence_loops(cls)
+    expansions = profile.expansions
+    actions = profile.actions
+    nesting = Nesting()
+    def __predict__(self,symbol,context):
+        # Predicting tokens is easy, see if it matches
+        if symbol in self.__terminals__:
+            token = context.token
+            if token.flavor != symbol:
+                raise expected_terminal(symbol,token)
+            context.token = context.next()
+            return token
+
+        # Time in the expansions inside this one goes on a stack, so
+        # we can take it off ours
+        inner = nesting.inner
+        start = default_timer()
+        inner.append(0.0)
+        try:
+            value = expand(self,symbol,context)
+        finally:
+            elapsed = default_timer()-start
+            nested = inner.pop()
+            if inner: inner[-1] += elapsed
+        entry = expansions.setdefault(symbol,[0,0.0])
+        entry[0] += 1
+        entry[1] += elapsed-nested
+        return value
+
+    def expand(self,symbol,context):
+        predictions = self.__predict_table__[symbol]
+        if symbol in loops:
+            element,sep,tail,more = loops[symbol]
+            tails = self.__predict_table__[tail]
+            value = []
+            while 1:
+                if context.token.flavor not in predictions:
+                    raise no_prediction(symbol,predictions,context.token)
+                value.append(self.__predict__(element,context))
+                flavor = context.token.flavor
+                if flavor not in more:
+                    if flavor not in tails:
+                        raise no_prediction(tail,tails,context.token)
+                    break
+                if sep is not None:
+                    value.append(self.__predict__(sep,context))
+        else:
+            prediction = predictions.get(context.token.flavor)
+            if prediction is None:
+                raise no_prediction(symbol,predictions,context.token)
+            action,requires = prediction
+            args = [self.__predict__(sym,context) for sym in requires]
+
+            called = default_timer()
+            value = action(self,*args)
+            entry = actions.setdefault(action.__name__,[0,0.0])
+            entry[0] += 1
+            entry[1] += default_timer()-called
+        return value
+    return __predict__
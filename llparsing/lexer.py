@@ -1,33 +1,428 @@
-import re
+import sys,re,string,mmap,weakref
+import sre_parse,sre_compile,sre_constants
+from array import array
+from bisect import bisect_left
 from util import AmbiguityError
 
-class Token:
+# Characters that make up a keyword pattern (see Lexer.keywords)
+keyword_char_set = set(string.letters+string.digits+'_')
+
+def first_characters(pattern):
+    """The set of characters a compiled pattern can start with
+
+    Returns None if we can't tell (the pattern may match the empty
+    string, ignores case, or uses a construct we don't look into).
+    The set is used to pick candidate patterns by the next character
+    in the input, so it must never be too small.
+    """
+    if pattern.flags & (re.IGNORECASE|re.LOCALE|re.UNICODE): return None
+    try:
+        items = sre_parse.parse(pattern.pattern,pattern.flags)
+    except Exception:
+        return None
+    chars,nullable = _first_characters(items)
+    if nullable: return None
+    return chars
+
+def _first_characters(items):
+    # Walk a sre_parse item list, returning (chars,nullable).  A
+    # chars of None means "could be anything"
+    C = sre_constants
+    chars = set()
+    for op,av in items:
+        if op is C.LITERAL:
+            if av > 255: return None,False
+            chars.add(chr(av))
+            return chars,False
+        elif op is C.IN:
+            for iop,iav in av:
+                if iop is C.LITERAL:
+                    if iav > 255: return None,False
+                    chars.add(chr(iav))
+                elif iop is C.RANGE:
+                    lo,hi = iav
+                    if hi > 255: return None,False
+                    chars.update(chr(i) for i in xrange(lo,hi+1))
+                elif iop is C.CATEGORY and iav in _category_characters:
+                    chars.update(_category_characters[iav])
+                else:
+                    return None,False
+            return chars,False
+        elif op is C.SUBPATTERN:
+            sub_chars,nullable = _first_characters(av[-1])
+            if sub_chars is None: return None,False
+            chars.update(sub_chars)
+            if not nullable: return chars,False
+        elif op is C.MAX_REPEAT or op is C.MIN_REPEAT:
+            lo,hi,sub = av
+            sub_chars,nullable = _first_characters(sub)
+            if sub_chars is None: return None,False
+            chars.update(sub_chars)
+            if lo > 0 and not nullable: return chars,False
+        elif op is C.BRANCH:
+            any_nullable = False
+            for alternative in av[1]:
+                sub_chars,nullable = _first_characters(alternative)
+                if sub_chars is None: return None,False
+                chars.update(sub_chars)
+                any_nullable = any_nullable or nullable
+            if not any_nullable: return chars,False
+        elif op is C.AT or op is C.ASSERT or op is C.ASSERT_NOT:
+            # Zero width, so look at what follows
+            continue
+        else:
+            return None,False
+    return chars,True
+
+_category_characters = {
+    sre_constants.CATEGORY_DIGIT : string.digits,
+    sre_constants.CATEGORY_SPACE : ' \t\n\r\f\v',
+    sre_constants.CATEGORY_WORD : string.letters+string.digits+'_',
+    }
+
+class _Undecided(Exception):
+    "A pattern uses a construct end_pattern doesn't follow"
+
+def end_pattern(pattern):
+    """A regex matching where a match of pattern could run to the end
+
+    That is, the end_pattern of a compiled pattern matches at an
+    offset in a text if the text from there on is a prefix of some
+    match, so that more text after it might change what pattern
+    matches.  It may match more often than that (lookarounds are
+    taken to pass, say), but never less.  As the regex does, a lazy
+    repeat at the top of the pattern stops where the rest matches,
+    so /\\*.*?\\*/ ends at the first */.  None if we can't tell (the
+    pattern uses a back reference, say)."""
+    try:
+        items = sre_parse.parse(pattern.pattern,pattern.flags)
+        state = sre_parse.Pattern()
+        state.flags = pattern.flags
+        return sre_compile.compile(_subpattern(state,_reach(state,items,True)),pattern.flags)
+    except Exception:
+        return None
+
+def _subpattern(state,items):
+    return sre_parse.SubPattern(state,list(items))
+
+def _reach(state,items,whole=False):
+    # Items matching a prefix of items and then the end of the text
+    C = sre_constants
+    reach = [(C.AT,C.AT_END_STRING)]
+    for i in xrange(len(items)-1,-1,-1):
+        op,av = items[i]
+        if op is C.MIN_REPEAT and whole:
+            # Repeats only while the rest doesn't match
+            lo,hi,sub = av
+            rest = (C.ASSERT_NOT,(1,_subpattern(state,_plain(state,items[i+1:]))))
+            sub = _plain(state,sub)
+            head = [(C.MAX_REPEAT,(lo,lo,_subpattern(state,sub)))] if lo else []
+            more = hi if hi == C.MAXREPEAT else hi-lo
+            head.append((C.MAX_REPEAT,(0,more,_subpattern(state,[rest]+sub))))
+            reach = head+[(C.BRANCH,(None,[_subpattern(state,_reach(state,av[2])),
+                                            _subpattern(state,reach)]))]
+            continue
+        partial = _partial(state,op,av)
+        reach = [(C.BRANCH,(None,[_subpattern(state,partial),
+                                  _subpattern(state,_plain(state,[(op,av)])+reach)]))]
+    return reach
+
+def _partial(state,op,av):
+    # Items matching part of one item and then the end of the text
+    C = sre_constants
+    if op is C.SUBPATTERN:
+        return _reach(state,av[-1])
+    elif op is C.BRANCH:
+        return [(C.BRANCH,(None,[_subpattern(state,_reach(state,alternative))
+                                 for alternative in av[1]]))]
+    elif op is C.MAX_REPEAT or op is C.MIN_REPEAT:
+        lo,hi,sub = av
+        return [(C.MAX_REPEAT,(0,hi,_subpattern(state,_plain(state,sub))))]+_reach(state,sub)
+    elif (op is C.ASSERT or op is C.ASSERT_NOT) and av[0] > 0:
+        # A lookahead may look past the end too
+        return _reach(state,av[1])
+    elif op in (C.LITERAL,C.NOT_LITERAL,C.ANY,C.IN,C.AT,C.ASSERT,C.ASSERT_NOT):
+        return [(C.AT,C.AT_END_STRING)]
+    raise _Undecided(op)
+
+def _plain(state,items):
+    # items without groups, which our patterns have no use for
+    C = sre_constants
+    result = []
+    for op,av in items:
+        if op is C.SUBPATTERN:
+            av = (None,_subpattern(state,_plain(state,av[-1])))
+        elif op is C.BRANCH:
+            av = (None,[_subpattern(state,_plain(state,alternative)) for alternative in av[1]])
+        elif op is C.MAX_REPEAT or op is C.MIN_REPEAT:
+            av = (av[0],av[1],_subpattern(state,_plain(state,av[2])))
+        elif op is C.ASSERT or op is C.ASSERT_NOT:
+            av = (av[0],_subpattern(state,_plain(state,av[1])))
+        elif op is C.GROUPREF or op is C.GROUPREF_EXISTS:
+            raise _Undecided(op)
+        result.append((op,av))
+    return result
+
+class Text(object):
+    """The source text shared by the tokens lexed from it
+
+    Line information is computed on demand from a table of newline
+    offsets that is built (once) the first time anyone asks.
+
+    Offsets are absolute.  A Text may hold just a piece of a larger
+    input (see Lexer.window) that starts at offset base, on line
+    first_lineno and column first_column.  The line text for such
+    a piece only shows the part of the line that it holds.
+
+    The source may be a memory map, which the Text owns: it is closed
+    once the Text (and so every token on it) is gone."""
+
+    def __init__(self,source,filename='<string>',base=0,first_lineno=1,first_column=0):
+        self.source = source
+        self.filename = filename
+        self.base = base
+        self.first_lineno = first_lineno
+        self.first_column = first_column
+        self.__newlines = None
+        if isinstance(source,mmap.mmap):
+            _maps[weakref.ref(self,_close_map)] = source
+        return
+
+    @property
+    def newlines(self):
+        "The (local) offsets of each newline in the source"
+        if self.__newlines is None:
+            self.__newlines = array('l',(m.start() for m in
+                                         re.finditer('\n',self.source)))
+        return self.__newlines
+
+    def __getstate__(self):
+        # A memory mapped source is pickled as a string, and we can
+        # always build the newlines again
+        state = dict(self.__dict__)
+        if isinstance(self.source,mmap.mmap):
+            state['source'] = self.source[:]
+        state['_Text__newlines'] = None
+        return state
+
+    def lineno(self,offset):
+        "The (1 based) line number at offset"
+        return bisect_left(self.newlines,offset-self.base)+self.first_lineno
+
+    def column(self,offset):
+        "The column at offset (not counting tab expansion)"
+        local = offset-self.base
+        i = bisect_left(self.newlines,local)
+        if i == 0: return local+self.first_column
+        return local-self.newlines[i-1]-1
+
+    def line(self,offset):
+        "The text of the line holding offset, tabs expanded"
+        newlines = self.newlines
+        i = bisect_left(newlines,offset-self.base)
+        start = newlines[i-1]+1 if i else 0
+        end = newlines[i] if i < len(newlines) else len(self.source)
+        return self.source[start:end].expandtabs()
+
+# The maps Texts own, by a weak reference to the Text
+_maps = {}
+
+def _close_map(ref):
+    _maps.pop(ref).close()
+    return
+
+class Token(object):
     """A simple token class
 
     A token has a flavor (the name of the token type), a value (the
-    text of the token), and some line information."""
+    text of the token), and an offset into the Text it came from
+    which gives the line information."""
+
+    __slots__ = ('value','flavor','offset','text')
 
-    def __init__(self,value,flavor,offset,filename,lineno,column,line):
+    def __init__(self,value,flavor,offset,text):
         self.value = value
         self.flavor = flavor
         self.offset = offset
-        self.filename = filename
-        self.lineno = lineno
-        self.column = column
-        self.line = line
+        self.text = text
         return
 
+    @property
+    def filename(self):
+        return self.text.filename
+
+    @property
+    def lineno(self):
+        return self.text.lineno(self.offset)
+
+    @property
+    def column(self):
+        return self.text.column(self.offset)
+
+    @property
+    def line(self):
+        return self.text.line(self.offset)
+
     def __str__(self):
         return self.line + '\n' + '-'*self.column + '^\n'
 
     def __repr__(self):
         return repr((self.value,self.flavor))
 
+class TokenArray(object):
+    """Tokens packed into parallel arrays over their shared Text
+
+    Each token is a flavor id, a start offset and a length, so the
+    tokens of a large input take a few bytes each instead of an
+    object and a string each.  Indexing (or iterating) gives a
+    TokenView, which only slices its value out when asked for it.
+    The last token is the eof.  See Lexer.compact.
+
+    A parser's lexer numbers the flavors as its DenseTable codes the
+    terminals (see Lexer.flavors), other flavors coming after."""
+
+    def __init__(self,text,flavors=()):
+        self.text = text
+        self.flavors = list(flavors)
+        self.ids = dict( (flavor,i) for i,flavor in enumerate(self.flavors) )
+        self.flavor_ids = array('H')
+        self.starts = array('l')
+        self.lengths = array('l')
+        return
+
+    def append(self,flavor,start,length):
+        "Add a token of flavor with length characters at offset start"
+        i = self.ids.get(flavor)
+        if i is None:
+            i = self.ids[flavor] = len(self.flavors)
+            self.flavors.append(flavor)
+        self.flavor_ids.append(i)
+        self.starts.append(start)
+        self.lengths.append(length)
+        return
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self,index):
+        if index < 0: index += len(self.starts)
+        if not 0 <= index < len(self.starts):
+            raise IndexError('token index out of range')
+        return TokenView(self,index)
+
+    def __iter__(self):
+        for index in xrange(len(self.starts)):
+            yield TokenView(self,index)
+        return
+
+    def stream(self):
+        "Tokens as the lexer gives them: every token, then eof forever"
+        for token in self:
+            yield token
+        while 1:
+            yield token
+        return
+
+class TokenView(object):
+    """A Token-like view of one token in a TokenArray
+
+    It has everything a Token has.  value is a copy of the token's
+    text, made each time it is asked for, while view is a buffer on
+    the source that copies nothing."""
+
+    __slots__ = ('tokens','index')
+
+    def __init__(self,tokens,index):
+        self.tokens = tokens
+        self.index = index
+        return
+
+    @property
+    def flavor(self):
+        tokens = self.tokens
+        return tokens.flavors[tokens.flavor_ids[self.index]]
+
+    @property
+    def offset(self):
+        return self.tokens.starts[self.index]
+
+    @property
+    def text(self):
+        return self.tokens.text
+
+    @property
+    def value(self):
+        tokens = self.tokens
+        start = tokens.starts[self.index]
+        return tokens.text.source[start:start+tokens.lengths[self.index]]
+
+    @property
+    def view(self):
+        tokens = self.tokens
+        return buffer(tokens.text.source,tokens.starts[self.index],tokens.lengths[self.index])
+
+    filename = Token.filename
+    lineno = Token.lineno
+    column = Token.column
+    line = Token.line
+    __str__ = Token.__str__.im_func
+    __repr__ = Token.__repr__.im_func
+
+class CombinedPattern:
+    """Several patterns folded into one regular expression
+
+    Each pattern sits in an optional lookahead with its own group, so
+    a single match reports what every pattern would have matched at
+    that offset without consuming anything.  Patterns must share the
+    same flags and have no groups of their own.
+    """
+
+    # The re module limits the number of groups in a pattern
+    limit = 99
+
+    def __init__(self,named_patterns,flags=0):
+        self.flavors = [flavor for flavor,_ in named_patterns]
+        self.regex = re.compile(''.join('(?:(?=({0}))|)'.format(v.pattern)
+                                        for _,v in named_patterns),flags)
+        return
+
+    @staticmethod
+    def combinable(pattern):
+        "Can this compiled pattern be folded into a CombinedPattern?"
+        return pattern.groups == 0 and not inline_flags.search(pattern.pattern)
+
+    def matches(self,source,offset):
+        "The (text,flavor) pairs for each pattern that matches at offset"
+        groups = self.regex.match(source,offset).groups()
+        return [(text,flavor) for text,flavor in zip(groups,self.flavors)
+                if text is not None]
+
+inline_flags = re.compile(r'\(\?[iLmsux]')
+
 class Lexer:
-    def __init__(self,terminals,source,eofsym):
+    """Turn a source string (or file) into a stream of Tokens
+
+    There are two engines.  The 'master' engine (the default) picks
+    candidate patterns by the next input character and runs them
+    through CombinedPatterns.  The 'legacy' engine tries every
+    pattern at every offset.  Choose with the engine argument or a
+    __lexer_engine__ attribute on the parser class.
+    """
+
+    engines = ('master','legacy')
+
+    # A Profile (see instrument) to count matches into
+    profile = None
+
+    # The terminals in the order of their codes (see engine.DenseTable),
+    # which a TokenArray numbers its flavors by
+    flavors = None
+
+    def __init__(self,terminals,source,eofsym,engine=None,tables=None):
         self.eofsym = eofsym
         missing = object()
         name2pattern = {}
+        literals = {}
         for sym in terminals:
             # We don't match a pattern for this one
             if sym == eofsym: continue
@@ -39,7 +434,7 @@ class Lexer:
                 if not isinstance(regex,str):
                     name2pattern[sym] = regex
                 else:
-                    name2pattern[sym] = re.compile(re.escape(regex))
+                    literals[sym] = regex
                 continue
 
             # OK... we need to intuit what the user wanted
@@ -53,20 +448,26 @@ class Lexer:
             
             if sym.startswith('_'):
                 if len(sym) == 2:
-                    name2pattern[sym] = sym[1]
+                    literals[sym] = sym[1]
                 elif sym.startswith('_0'):
                     try:
-                        name2pattern[sym] = re.compile(chr(int(sym[1:],8)))
+                        literals[sym] = chr(int(sym[1:],8))
                     except ValueError:
-                        name2pattern[sym] = re.compile(re.escape(sym))
+                        literals[sym] = sym
                 else:
-                    name2pattern[sym] = re.compile(re.escape(sym))
+                    literals[sym] = sym
             else:
                 s = sym
                 while s:
                     if s[-1] not in '012345678_': break
                     s = s[:-1]
-                name2pattern[sym] = re.compile(re.escape(s))
+                literals[sym] = s
+
+        # The master engine matches literals by comparing text (see
+        # __candidates), but they get patterns for everything else
+        for sym,text in literals.iteritems():
+            name2pattern[sym] = re.compile(re.escape(text))
+        self.literals = dict( (sym,text) for sym,text in literals.iteritems() if text )
 
         # We may have some comments and whitespace things to ignore...
         for k in dir(source):
@@ -79,91 +480,352 @@ class Lexer:
 
         # Some of our patterns are simple keywords which we prefer
         # over other matches
-        import string
-        keyword_char_set = set(string.letters+string.digits+'_')
         self.keywords = set( flavor for flavor,v in name2pattern.iteritems()
                              if all((character in keyword_char_set)
                                     for character in v.pattern) )
 
         self.patterns = name2pattern
+
+        if engine is None:
+            engine = getattr(source,'__lexer_engine__','master')
+        if engine not in self.engines:
+            raise ValueError('unknown lexer engine {0!r}'.format(engine))
+        self.engine = engine
+
+        # The master engine builds its candidate lists lazily, one
+        # for each character it sees.  The first characters of each
+        # pattern may come from a cache (see tables)
+        if tables is not None:
+            self.first = tables['first']
+        else:
+            self.first = dict( (flavor,first_characters(v))
+                               for flavor,v in name2pattern.iteritems() )
+        self.__dispatch = {}
+        self.__followers = {}
         return
 
-    def __call__(self,source,*args,**kwargs):
-        self.filename = getattr(source,'name','<string>')
-        read = getattr(source,'read',None)
-        # TODO: try mmap interface
-        if read is not None:
-            source = source.read()
-        offset = 0
-        self.lineno = 1
+    def tables(self):
+        "The analysis of our patterns, which can be passed back in as tables"
+        return {'first' : self.first}
+
+    def __candidates(self,character):
+        """The (match,flavor,combined,literals) entry for character
+
+        literals are the (text,flavors) of the literal terminals that
+        start with character, longest first, and the rest are for
+        the patterns that can start with it."""
+        try: return self.__dispatch[character]
+        except KeyError: pass
+
+        first = self.first
+        by_text = {}
+        candidates = []
+        for flavor,v in self.patterns.iteritems():
+            if first[flavor] is not None and character not in first[flavor]: continue
+            text = self.literals.get(flavor)
+            if text is None:
+                candidates.append((flavor,v))
+            elif text[0] == character:
+                by_text.setdefault(text,[]).append(flavor)
+        literals = tuple(sorted(((text,tuple(sorted(flavors)))
+                                 for text,flavors in by_text.iteritems()),
+                                key=lambda (text,_): -len(text)))
+
+        # A lone candidate is matched directly, otherwise we group
+        # the candidates by flags into combined patterns
+        if len(candidates) == 1:
+            flavor,v = candidates[0]
+            entry = (v.match,flavor,None,literals)
+        else:
+            combined = []
+            by_flags = {}
+            for flavor,v in candidates:
+                if CombinedPattern.combinable(v):
+                    by_flags.setdefault(v.flags,[]).append((flavor,v))
+                else:
+                    combined.append(CombinedPattern([(flavor,v)],v.flags))
+            for flags,named_patterns in by_flags.iteritems():
+                for i in xrange(0,len(named_patterns),CombinedPattern.limit):
+                    chunk = named_patterns[i:i+CombinedPattern.limit]
+                    combined.append(CombinedPattern(chunk,flags))
+            entry = (None,None,combined,literals)
+        self.__dispatch[character] = entry
+        return entry
+
+    def settled(self,source,pos):
+        """True if no text after source could change the token at pos
 
+        That is, no pattern that can start at pos has a match that
+        runs on to the end of source (see end_pattern).  A pattern
+        we can't follow is taken to end by the end of the line."""
+        left = len(source)-pos
+        if left <= 0: return False
+        character = source[pos]
+        try:
+            followers = self.__followers[character]
+        except KeyError:
+            followers = self.__followers[character] = [
+                self.__ends(flavor) for flavor,first in self.first.iteritems()
+                if first is None or character in first]
+        undecided = False
+        for ends,width in followers:
+            # A pattern that can't match as much as is left can't reach the end
+            if width < left: continue
+            if ends is None:
+                undecided = True
+            elif ends.match(source,pos):
+                return False
+        return not undecided or source.find('\n',pos) >= 0
+
+    def __ends(self,flavor):
+        "The end_pattern and the longest match of a pattern"
+        v = self.patterns[flavor]
+        try:
+            width = sre_parse.parse(v.pattern,v.flags).getwidth()[1]
+        except Exception:
+            width = sys.maxint
+        return end_pattern(v),width
+
+    def __master_matches(self,source,offset):
+        "All (text,flavor) matches at offset using the first character table"
+        if offset >= len(source): return []
+        match,flavor,combined,literals = self.__candidates(source[offset])
+
+        if not literals and match is not None:
+            m = match(source,offset)
+            if m is None: return []
+            return [(m.group(),flavor)]
+
+        # Only the longest literal that matches can be the token
+        good_matches = []
+        for text,flavors in literals:
+            if source[offset:offset+len(text)] == text:
+                good_matches = [(text,literal) for literal in flavors]
+                break
+
+        if match is not None:
+            m = match(source,offset)
+            if m is not None:
+                good_matches.append((m.group(),flavor))
+        else:
+            for c in combined:
+                good_matches += c.matches(source,offset)
+        return good_matches
+
+    def __legacy_matches(self,source,offset):
+        "All (text,flavor) matches at offset trying every pattern"
         patterns = self.patterns
         match = re.match
         values = patterns.values()
         keys = patterns.keys()
+
+        # We jump to the current point
+        buf = buffer(source,offset)
+
+        # Apply all the regex
+        matches = [match(value,buf) for value in values]
+
+        # Pick only matches that succeed
+        return [(m.group(),key) for m,key in zip(matches,keys)
+                if m is not None]
+
+    def __profiled_matches(self,source,offset):
+        """The best match at offset, counting into our profile
+
+        We try the patterns the master engine would, one by one."""
+        if offset >= len(source): return []
+        profile = self.profile
+        attempts = profile.attempts
+        matches = profile.matches
+        character = source[offset]
+        first = self.first
+        good_matches = []
+        for flavor,v in self.patterns.iteritems():
+            if first[flavor] is not None and character not in first[flavor]: continue
+            attempts[flavor] = attempts.get(flavor,0)+1
+            m = v.match(source,offset)
+            if m is not None:
+                matches[flavor] = matches.get(flavor,0)+1
+                good_matches.append((m.group(),flavor))
+        if not good_matches: return []
+        m,flavor = self.choose(good_matches)
+        profile.tokens[flavor] = profile.tokens.get(flavor,0)+1
+        return [(m,flavor)]
+
+    def choose(self,good_matches):
+        """Pick the best of several (text,flavor) matches
+
+        The best match is the longest token.  It is ambiguous if
+        several matches are that long (unless exactly one of them
+        is a keyword)."""
+        if len(good_matches) == 1: return good_matches[0]
+
+        longest = max(len(m) for m,_ in good_matches)
+        longest_matches = [x for x in good_matches if len(x[0]) == longest]
+
+        # If we have exactly one keyword match, we return that
+        keyword_matches = [(m,flavor) for m,flavor in longest_matches
+                           if flavor in self.keywords]
+        if len(keyword_matches) == 1:
+            return keyword_matches[0]
+        elif len(longest_matches) > 1:
+            raise AmbiguityError('Token {0} is one of {1}\n'.format(
+                    longest_matches[0][0],
+                    '|'.join(sorted(flavor for _,flavor in longest_matches))
+                    ))
+        return longest_matches[0]
+
+    def match(self,source,pos,matches=None):
+        """The (text,flavor) of the token at pos in source
+
+        A character no pattern matches is a token of its own, named
+        by its octal code, and the end of the source is an eof token
+        with empty text."""
+        if matches is None: matches = self.matcher()
+        good_matches = matches(source,pos)
+
+        # No match is OK on end-of-string
+        if not good_matches:
+            if pos < len(source):
+                m = source[pos]
+                return m,'_%03o'%ord(m)  # Name is octal name
+            return '',self.eofsym
+        return self.choose(good_matches)
+
+    def __call__(self,source,*args,**kwargs):
+        """Lex a string or a file-like object
+
+        Real files are memory mapped (and the map closed once the
+        tokens are done with).  Other streams with a fileno (pipes,
+        sockets) are read through a sliding window of about
+        Lexer.window characters, so memory stays bounded no matter
+        how large the input is, though we read on past the window
+        while a token there might still be cut off (see settled).
+        Anything else with a read method is read in one go.  A
+        TokenArray is already lexed, so we just stream its tokens."""
+        if isinstance(source,TokenArray):
+            return source.stream()
+        filename = getattr(source,'name','<string>')
+        source,stream,start = self.__open(source)
+        return self.__tokens(Text(source,filename),self.matcher(),stream,start)
+
+    def __open(self,source):
+        """The string (or map) to lex for source, a read function for a
+        stream and the offset to start lexing at
+
+        A file is lexed from its current position, so a caller may
+        read a header first.  We map all of it (map offsets must be
+        page aligned) and start part way in, which keeps the line
+        numbers those of the file."""
+        read = getattr(source,'read',None)
+        if read is None: return source,None,0
+        try:
+            fileno = source.fileno()
+        except (AttributeError,IOError,ValueError):
+            return read(),None,0
+        try:
+            start = source.tell()
+        except (AttributeError,IOError,ValueError):
+            start = 0
+        try:
+            return mmap.mmap(fileno,0,access=mmap.ACCESS_READ),None,start
+        except (mmap.error,ValueError,OverflowError):
+            return '',read,0
+
+    def compact(self,source):
+        """Lex all of a string or file-like object into a TokenArray
+
+        Ignored tokens are dropped and the eof token is kept.  A
+        stream is read in full, as the array's tokens share one
+        source.  A parser's __parse__ takes the array in place of
+        the source."""
+        filename = getattr(source,'name','<string>')
+        source,read,pos = self.__open(source)
+        if read is not None: source = ''.join(iter(lambda: read(self.window),''))
+        tokens = TokenArray(Text(source,filename),self.flavors or sorted(self.patterns)+[self.eofsym])
+        matches = self.matcher()
+        eofsym = self.eofsym
         while 1:
-            # We jump to the current point
-            buf = buffer(source,offset)
+            m,flavor = self.match(source,pos,matches)
+            if flavor == eofsym:
+                tokens.append(flavor,pos,0)
+                return tokens
+            if not flavor.startswith('ignore'):
+                tokens.append(flavor,pos,len(m))
+            pos += len(m)
 
-            # Apply all the regex
-            matches = [match(value,buf) for value in values]
+    def scan(self,text,offset=0):
+        """Tokens from a Text, starting at offset
 
-            # Pick only matches that succeed
-            good_matches = [(m.group(),key) for m,key in zip(matches,keys)
-                            if m is not None]
+        The offset should be a token boundary, say the end of an
+        earlier token, for the tokens to be the same as lexing the
+        whole text."""
+        return self.__tokens(text,self.matcher(),offset=offset)
 
-            # No match is OK on end-of-string
-            if not good_matches:
-                if buf:
-                    m = buf[0]
-                    flavor = '_%03o'%ord(m)  # Name is octal name
-                else:
-                    m = ''
-                    flavor = self.eofsym
+    def matcher(self):
+        """The match function of our engine
 
-            # Normally, we'll only have one match, return it
-            elif len(good_matches) == 1:
-                m,flavor = good_matches[0]
+        It is called as matches(source,offset) and returns a list of
+        (text,flavor) matches, for choose to pick from."""
+        if self.profile is not None:
+            return self.__profiled_matches
+        if self.engine == 'legacy':
+            return self.__legacy_matches
+        return self.__master_matches
 
-            # Best match is the longest token
-            else:
-                def key(x):
-                    return len(x[0])
-                best_matches = sorted(good_matches,key=key)
-
-                # We pick the longest match.  It is ambiguous if any
-                # matches are the same length (unless one is a keyword)
-                longest_matches = [x for x in best_matches
-                                   if len(x[0]) == len(best_matches[0][0])]
-
-                # If we have exactly one keyword match, we return that
-                keyword_matches = [(m,flavor) for m,flavor in longest_matches
-                                   if flavor in self.keywords]
-                if len(keyword_matches) == 1:
-                    m,flavor = keyword_matches[0]
-                elif len(longest_matches) > 1:
-                    raise AmbiguityError('Token {0} is one of {1}\n'.format(
-                            matches[0][0],
-                            '|'.join(x[1] for x in matches)
-                            ))
-                else:
-                    m,flavor = longest_matches[0]
+    # Characters we keep ahead of the current offset (and read at a
+    # time) when lexing a stream
+    window = 1<<16
+
+    def __slide(self,text,offset,read,grow=False):
+        """Read more of a stream into a new Text
+
+        Unless we grow the window to finish a long token, we drop the
+        lines before offset.  Tokens already made keep their own Text,
+        so their line information stays right."""
+        source = text.source
+        local = offset-text.base
+        cut = 0
+        if not grow:
+            cut = source.rfind('\n',0,local)+1
+            if cut == 0 and local > self.window: cut = local
+        data = read(self.window)
+        if not data: read = None
+        if not cut and not data: return text,read
+
+        lineno = text.lineno(text.base+cut)
+        column = text.column(text.base+cut)
+        return Text(source[cut:]+data,text.filename,text.base+cut,lineno,column),read
+
+    def __tokens(self,text,matches,read=None,offset=None):
+        source = text.source
+        if offset is None: offset = text.base
+        eofsym = self.eofsym
+
+        while 1:
+            # A stream keeps a window of text ahead of the offset
+            if read is not None and len(source)-(offset-text.base) < self.window:
+                text,read = self.__slide(text,offset,read)
+                source = text.source
+            pos = offset-text.base
+
+            # The token might be cut off at the end of the window (a
+            # string, or a / starting a comment), so read and retry
+            if read is not None and not self.settled(source,pos):
+                text,read = self.__slide(text,offset,read,grow=True)
+                source = text.source
+                continue
 
-            # We build our token...
-            start_line = source.rfind('\n',0,offset)+1
-            end_line = source.find('\n',start_line)
-            if end_line == -1: end_line = len(source)
-            column = offset-start_line
-            token = Token(m,flavor,offset,self.filename,self.lineno,column,source[start_line:end_line].expandtabs())
+            m,flavor = self.match(source,pos,matches)
 
-            # and update the positions
-            self.lineno += m.count('\n')
+            # We build our token and update the position
+            token = Token(m,flavor,offset,text)
             offset += len(m)
 
             # We ignore some tokens, and finish with an EOF
             if flavor.startswith('ignore'): continue
             yield token
-            if flavor == self.eofsym: break
+            if flavor == eofsym: break
 
         # We keep yielding EOF forever
         while 1:
@@ -1,6 +1,12 @@
 import re,types
+from timeit import default_timer
+import threading
 from grammar import Grammar
 from lexer import Lexer
+from engine import engines
+from util import AmbiguityError
+from context import Context,current_token
+import codegen,cache,incremental,batch,push,recovery,instrument,events,validate,results,streaming
 
 class template(object):
     def __init__(self,f):
@@ -10,6 +16,14 @@ class template(object):
     def updates(self):
         return {}
 
+    def loops(self):
+        "Productions the parse engines should run as native loops"
+        return {}
+
+    def climbs(self):
+        "Productions the parse engines should run by precedence climbing"
+        return {}
+
 def set_arguments(f,args,fname=None):
     co = f.func_code
     nargs = len(args)
@@ -42,9 +56,25 @@ def set_arguments(f,args,fname=None):
     return newfunc
 
 class sequence(template):
-    def updates(self):
+    def arguments(self):
         # The function should look list foolist(foo,sep)
         # or foolist(foo)
+        co = self.function.func_code
+        args = co.co_varnames[1:co.co_argcount]
+        if len(args) == 1:
+            return args[0],None
+        elif len(args) == 2:
+            return args
+        raise RuntimeError('Invalid arg count for @sequence (1 or 2)')
+
+    def loops(self):
+        # The engines parse foos_body with a loop that appends to a
+        # single list rather than recursing through foos_tail
+        fname = self.function.func_name
+        element,sep = self.arguments()
+        return {fname+'_body' : (stem(element),sep and stem(sep),fname+'_tail')}
+
+    def updates(self):
 
         # We need three new functions (productions) to build the list
         # so if we start with
@@ -55,9 +85,8 @@ class sequence(template):
         #   foos_tail  -> sep foos
         #   foos_tail_ -> 
 
-        co = self.function.func_code
         fname = self.function.func_name
-        args = co.co_varnames[1:self.function.func_code.co_argcount]
+        element,sep = self.arguments()
 
         def main_function(self,element,tail):
             tail.insert(0,element)
@@ -65,14 +94,6 @@ class sequence(template):
         def tail_function_(self):
             return []
 
-        if len(args) == 1:
-            element = args[0]
-            sep = None
-        elif len(args) == 2:
-            element,sep = args
-        else:
-            raise RuntimeError('Invalid arg count for @sequence (1 or 2)')
-
         main = fname+'_body'
         tail = fname+'_tail'
         tail_ = fname+'_tail_'
@@ -103,6 +124,114 @@ class sequence(template):
 
         return result
 
+class operators(template):
+    """Binary operators of a non-terminal, by precedence
+
+        @operators(plus=1,minus=1,times=2,divide=2,power=(3,'right'))
+        def expr(self,factor,op,factor_): return (op.value,factor,factor_)
+
+    gives expr for factors joined by any of the operators, with the
+    action called for each operator in turn.  Higher levels bind
+    tighter, and operators are left associative unless marked 'right'.
+    Like rule arguments, the names are stemmed, so a keyword operator
+    that Python won't take as a name is spelt and_ or or_.
+    The grammar is
+      expr         -> factor expr_tail
+      expr_tail_   -> plus factor expr_tail    (and so on for each operator)
+      expr_tail    ->
+    which the recursive and compiled engines parse with a precedence
+    climbing loop instead.  Other engines parse it as written, and
+    then fold the operands together by precedence.  That gives the
+    same result, but the actions within operands (a parenthesized
+    expression, say) may be called before operator actions that
+    climbing calls first."""
+
+    def __init__(self,**precedences):
+        self.function = None
+        self.precedences = {}
+        names = {}
+        for name,level in precedences.iteritems():
+            flavor = stem(name)
+            if flavor in names:
+                raise RuntimeError('@operators {0} and {1} are both the terminal {2}'.format(
+                        *sorted((names[flavor],name))+[flavor]))
+            names[flavor] = name
+            associativity = 'left'
+            if isinstance(level,tuple): level,associativity = level
+            if not isinstance(level,int) or level < 1:
+                raise RuntimeError('@operators levels must be positive integers')
+            if associativity not in ('left','right'):
+                raise RuntimeError("@operators associativity must be 'left' or 'right'")
+            self.precedences[flavor] = (level,associativity == 'right')
+        return
+
+    def __call__(self,f):
+        self.function = f
+        return self
+
+    def arguments(self):
+        # The function should look like expr(self,operand,op,operand_)
+        co = self.function.func_code
+        args = co.co_varnames[1:co.co_argcount]
+        if len(args) != 3 or stem(args[0]) != stem(args[2]):
+            raise RuntimeError('@operators needs an action like expr(self,operand,op,operand_)')
+        return args[0]
+
+    def climbs(self):
+        fname = self.function.func_name
+        return {fname : (stem(self.arguments()),fname+'_tail',self.precedences,self.function)}
+
+    def updates(self):
+        fname = self.function.func_name
+        operand = self.arguments()
+        binary = self.function
+        precedences = self.precedences
+
+        # The tail gathers the operators and operands in reverse
+        def main_function(self,operand,tail):
+            tail.append(operand)
+            tail.reverse()
+            return fold(self,binary,precedences,tail)
+        def tail_function(self,op,operand,tail):
+            tail.append(operand)
+            tail.append(op)
+            return tail
+        def tail_function_(self):
+            return []
+
+        tail = fname+'_tail'
+        result = {
+            fname : set_arguments(main_function,('self',operand,tail),fname),
+            tail : set_arguments(tail_function_,('self',),tail),
+            }
+        for i,flavor in enumerate(sorted(precedences)):
+            name = tail+'_'*(i+1)
+            result[name] = set_arguments(tail_function,('self',flavor,operand,tail),name)
+        return result
+
+def fold(parser,binary,precedences,items):
+    """Apply binary to operands and operators [a,op,b,op,c...] by precedence
+
+    The operators' actions are called in the order precedence
+    climbing would call them."""
+    values = [items[0]]
+    pending = []
+    def combine():
+        rhs = values.pop()
+        values[-1] = binary(parser,values[-1],pending.pop(),rhs)
+        return
+    for i in xrange(1,len(items),2):
+        op = items[i]
+        level,right = precedences[op.flavor]
+        while pending:
+            before = precedences[pending[-1].flavor][0]
+            if before < level or (before == level and right): break
+            combine()
+        pending.append(op)
+        values.append(items[i+1])
+    while pending: combine()
+    return values[0]
+
 def stem(s):
     while s:
         if s[-1] not in '012345678_': break
@@ -114,31 +243,62 @@ def method_as_rule(m):
     non_self_args = co.co_varnames[1:co.co_argcount]
     return stem(m.__name__),map(stem,non_self_args)
 
-def find_methods(T,key):
-    import types
-    candidates = [getattr(T,name) for name in dir(T) if stem(name) == key]
-    return [m for m in candidates if isinstance(m,types.MethodType)]
+def method_index(T):
+    "Map each stem to the methods of T with that stem"
+    index = {}
+    for name in dir(T):
+        # __names__ are for python and for us, not for the grammar
+        # (and reading a lazy one would compile a base class)
+        if name.startswith('__') and name.endswith('__'): continue
+        m = getattr(T,name)
+        if isinstance(m,types.MethodType):
+            index.setdefault(stem(name),[]).append(m)
+    return index
+
+def find_methods(T,key,index=None):
+    if index is None: index = method_index(T)
+    return index.get(key,[])
 
 class ParserType(type):
+    # Seconds spent building each parser class, by module.name
+    build_times = {}
+
     def __new__(meta,name,bases,dct):
+        started = default_timer()
+        result = meta.__build(meta,name,bases,dct)
+
+        # Only classes with a grammar (not base classes) count
+        if '__eof__' in result.__dict__:
+            result.__build_time__ = default_timer()-started
+            meta.build_times['{0}.{1}'.format(result.__module__,name)] = result.__build_time__
+        return result
+
+    @staticmethod
+    def __build(meta,name,bases,dct):
         # We may have some templates in the dictionary...
         # Expand those now
+        loops = {}
+        climbs = {}
         for k,v in dct.items():
             if isinstance(v,template):
                 del dct[k]
                 dct.update(v.updates())
+                loops.update(v.loops())
+                climbs.update(v.climbs())
 
         # Build a type that we use to find methods in a consistent
         # way
         T = super(ParserType,meta).__new__(meta,name,bases,dct)
-
+        T.__sequences__ = dct['__sequences__'] = dict(getattr(T,'__sequences__',{}),**loops)
+        T.__operators__ = dct['__operators__'] = dict(getattr(T,'__operators__',{}),**climbs)
 
         # We start with a rule for the start symbol and try to
         # add any other non-terminal rule we can find. If there
         # is no start symbol, this is just a base class so there
         # is no parser to build
         start_symbol = dct.get('__start__','start')
-        starts = find_methods(T,start_symbol)
+        index = method_index(T)
+        starts = find_methods(T,start_symbol,index)
         if not starts: return T
 
         # If the start is ambiguous, give up
@@ -146,18 +306,216 @@ class ParserType(type):
             raise AmbiguityError('multiple start symbols: {0}'.format(
                     ' '.join(x.__name__ for x in starts)))
 
+        engine = getattr(T,'__engine__','recursive')
+        if engine not in engines:
+            raise ValueError('unknown parse engine {0!r}'.format(engine))
+
+        # Add in generated default parser if needed.  A streamed class
+        # parses to a generator of items (see streaming)
+        streamed = getattr(T,'__streamed__',None)
+        if streamed and getattr(T,'__results__',None):
+            raise ValueError('{0} streams its results, so it cannot cache them'.format(name))
+        if '__parse__' not in dct and streamed:
+            def __parse__(self,*args,**kwargs):
+                return streaming.items(self,*args,**kwargs)
+            dct['__parse__'] = __parse__
+        elif '__parse__' not in dct:
+            def __parse__(self,*args,**kwargs):
+                with Context(self,self.__lexer__(*args,**kwargs)) as context:
+                    return self.__predict__(start_symbol,context)
+            dct['__parse__'] = __parse__
+
+        # A lazy class gets placeholders that build the tables the
+        # first time any of them is used (see __compile__)
+        pending = (T,dict(dct),starts[0],start_symbol,index)
+        if getattr(T,'__lazy__',False):
+            placeholders = [lazy(attribute) for attribute in meta.lazy_attributes
+                            if attribute not in dct]
+            for placeholder in placeholders:
+                dct[placeholder.name] = placeholder
+            dct['__pending__'] = pending
+            return super(ParserType,meta).__new__(meta,name,bases,dct)
+
+        attributes = meta.__attributes(*pending)
+        dct.update(attributes)
+        result = super(ParserType,meta).__new__(meta,name,bases,dct)
+        meta.__finish(result,attributes,pending)
+        return result
+
+    # The attributes a lazy class builds on first use
+    lazy_attributes = ('__grammar__','__predict_table__','__terminals__',
+                       '__non_terminals__','__eof__','__lexer__','__predict__')
+
+    # Lazy classes are compiled one at a time
+    compile_lock = threading.RLock()
+
+    def __compile__(cls):
+        """Build the tables of a lazy parser class now
+
+        This is done for you the first time the class parses or one
+        of its tables is read, but can be called to warm it up.  It
+        does nothing for a class that is already built."""
+        with ParserType.compile_lock:
+            pending = cls.__dict__.get('__pending__')
+            if pending is None: return cls
+
+            started = default_timer()
+            attributes = ParserType.__attributes(*pending)
+            ParserType.__finish(cls,attributes,pending)
+            del cls.__pending__
+
+            elapsed = default_timer()-started
+            cls.__build_time__ = getattr(cls,'__build_time__',0)+elapsed
+            ParserType.build_times['{0}.{1}'.format(cls.__module__,cls.__name__)] = cls.__build_time__
+        return cls
+
+    def parse_many(cls,paths,workers=None,ordered=True,chunksize=4):
+        "Parse many files in worker processes (see batch.parse_many)"
+        return batch.parse_many(cls,paths,workers,ordered,chunksize)
+
+    @staticmethod
+    def __attributes(T,dct,start,start_symbol,index):
+        "The tables (and lexer) for a class, built with trial type T"
+        attributes = {}
+
+        # A class may name a module generated by codegen, which
+        # saves us the grammar analysis
+        compiled = dct.get('__compiled__')
+        setting = tables = None
+        if compiled is not None:
+            codegen.check(T,compiled)
+            eof = compiled.eof
+            attributes['__grammar__'] = None
+            attributes['__predict_table__'] = None
+            attributes['__terminals__'] = terminals = compiled.terminals
+            attributes['__non_terminals__'] = compiled.non_terminals
+        else:
+            # We may have the tables in the on-disk cache
+            setting = getattr(T,'__cache__',None)
+            if setting:
+                directory = cache.directory(setting)
+                cache_key = cache.key(T,start_symbol)
+                tables = cache.load(directory,cache_key)
+
+            if tables is not None:
+                eof,G,predict = ParserType.__restore(T,start_symbol,tables)
+            else:
+                eof,G = ParserType.__analyze(T,start,start_symbol,index)
+                predict = G.predict
+            attributes['__grammar__'] = G
+            attributes['__predict_table__'] = predict
+            attributes['__terminals__'] = terminals = G.T
+            attributes['__non_terminals__'] = G.NT
+        attributes['__eof__'] = eof
+
+        # Add in generated default lexer if needed
+        if '__lexer__' not in dct:
+            lexer_tables = tables and tables['lexer']
+            attributes['__lexer__'] = Lexer(terminals,T,eof,tables=lexer_tables)
+
+        # Fresh tables go in the cache
+        if setting and tables is None:
+            cache.save(directory,cache_key,ParserType.__tables(attributes))
+        return attributes
+
+    @staticmethod
+    def __finish(result,attributes,pending):
+        "Put the tables on result and give it a __predict__ method"
+        T,dct = pending[:2]
+
+        # We need to patch the predict table so that we use result's
+        # unbound methods, not the trial type's methods
+        predict_table = attributes['__predict_table__']
+        if predict_table is not None:
+            for sym,predictions in predict_table.iteritems():
+                for terminal,(badmethod,args) in predictions.items():
+                    goodmethod = getattr(result,badmethod.__name__)
+                    predictions[terminal] = (goodmethod,args)
+
+        # (A lazy class still has placeholders for these)
+        for attribute,value in attributes.iteritems():
+            if isinstance(result.__dict__.get(attribute),lazy):
+                setattr(result,attribute,value)
+
+        # The lexer numbers its flavors as engine.DenseTable codes the
+        # terminals, though only the dense engine and validate build
+        # the table (see engine.dense_table)
+        if predict_table is not None and isinstance(result.__lexer__,Lexer):
+            result.__lexer__.flavors = sorted(attributes['__terminals__'])
+
+        # The parse engine gives us the __predict__ method
+        compiled = dct.get('__compiled__')
+        if compiled is not None:
+            result.__predict__ = codegen.compiled(result,compiled)
+        else:
+            result.__predict__ = engines[getattr(T,'__engine__','recursive')](result)
+
+        # A class caching its results gets a ResultCache of its own,
+        # keyed by its grammar, which its __parse__ looks in first
+        setting = getattr(T,'__results__',None)
+        if setting:
+            if isinstance(setting,results.ResultCache):
+                setting = setting.settings()
+            elif setting is True:
+                setting = {}
+            result_cache = results.ResultCache(**setting)
+            result_cache.grammar = cache.key(T,pending[3])
+            result.__results__ = result_cache
+            result.__parse__ = results.cached(result.__parse__.im_func,result_cache)
+
+        # A profiled class gets a Profile of its own, which its
+        # engine and lexer count into
+        if getattr(T,'__profile__',None):
+            profile = result.__profile__ = instrument.Profile()
+            if isinstance(result.__lexer__,Lexer):
+                result.__lexer__.profile = profile
+            if predict_table is not None:
+                result.__predict__ = instrument.profiled(result,profile)
+        return
+
+    @staticmethod
+    def __tables(attributes):
+        "The tables we save in the cache, with methods replaced by names"
+        G = attributes['__grammar__']
+        predict = dict( (sym,dict( (terminal,(method.__name__,requires))
+                                   for terminal,(method,requires) in predictions.iteritems() ))
+                        for sym,predictions in attributes['__predict_table__'].iteritems() )
+        lexer = attributes.get('__lexer__')
+        return {
+            'eof' : attributes['__eof__'],
+            'rules' : G.rules,
+            'labels' : G.labels,
+            'predict' : predict,
+            'lexer' : lexer.tables() if isinstance(lexer,Lexer) else None,
+            }
+
+    @staticmethod
+    def __restore(T,start_symbol,tables):
+        "The eof symbol, Grammar and predict table from cached tables"
+        rules = tables['rules']
+        labels = tables['labels']
+        actions = [(getattr(T,label),rhs) for label,(_,rhs) in zip(labels,rules)]
+        backend = getattr(T,'__analysis__','worklist')
+        G = Grammar(rules,start_symbol,actions,labels,backend)
+        predict = dict( (sym,dict( (terminal,(getattr(T,label),requires))
+                                   for terminal,(label,requires) in predictions.iteritems() ))
+                        for sym,predictions in tables['predict'].iteritems() )
+        return tables['eof'],G,predict
+
+    @staticmethod
+    def __analyze(T,start,start_symbol,index):
+        "The eof symbol and Grammar for the rules reachable from start"
         # See what rules we can reach from the start symbol
         # the rhs contains both terminals and non-terminals.
         # It's a NT if there is a stemmed method that matches
         # otherwise it is a terminal.
-        start = starts[0]
         NT = set()
         start_rule = method_as_rule(start)
         start_rhs = start_rule[1]
         if not start_rhs:
             raise AmbiguityError('start rule has an empty rhs')
         eof = start_rhs[-1]
-        if find_methods(T,eof):
+        if find_methods(T,eof,index):
             raise AmbiguityError('start rule must end with an eof terminal symbol')
         rules = []
         actions = []
@@ -170,7 +528,7 @@ class ParserType(type):
             if sym in NT: continue
         
             # If we have no stemmed methods, it is a terminal
-            methods = find_methods(T,sym)
+            methods = find_methods(T,sym,index)
             if not methods: continue
 
             # symbol must be a non-terminal
@@ -185,72 +543,54 @@ class ParserType(type):
                 rules.append(r)
 
         # We pull some info from the grammar we generate
-        G = Grammar(rules,start_symbol,actions,labels)
-        dct['__grammar__'] = G
-        dct['__predict_table__'] = G.predict
-        dct['__terminals__'] = G.T
-        dct['__non_terminals__'] = G.NT
-
-        # Add in generated default parser and lexer if needed
-        if '__parse__' not in dct:
-            def __parse__(self,*args,**kwargs):
-                stream = iter(self.__lexer__(*args,**kwargs))
-                self.__current_token__ = next(stream)
-                return self.__predict__(start_symbol,stream)
-            dct['__parse__'] = __parse__
+        backend = getattr(T,'__analysis__','worklist')
+        return eof,Grammar(rules,start_symbol,actions,labels,backend)
 
-        if '__lexer__' not in dct:
-            dct['__lexer__'] = __lexer__ = Lexer(G.T,T,eof)
-
-
-        def __predict__(self,symbol,stream):
-            # Predicting tokens is easy, see if it matches
-            if symbol in self.__terminals__:
-                token = self.__current_token__
-                if token.flavor != symbol:
-                    raise SyntaxError('{0}:{1}: expected {2}, got {3}\n'.format(
-                            token.filename,
-                            token.lineno,
-                            symbol,
-                            token.flavor)
-                                      + str(token))
-                self.__current_token__ = next(stream)
-                return token
-
-            # For non-terminals, we go to the table
-            predictions = self.__predict_table__[symbol]
-            prediction = predictions.get(self.__current_token__.flavor)
-            if prediction is None:
-                raise SyntaxError('{0}:{1}: for {2}, expected {3}, got {4}\n'.format(
-                        self.__current_token__.filename,
-                        self.__current_token__.lineno,
-                        symbol,
-                        ' or '.join(predictions.keys()),
-                        self.__current_token__.flavor)
-                                  + str(self.__current_token__))
-            action,requires = prediction
-            # We unwind much of the predict(predict(predict(...))) here
-            # for readability
-            try:
-                args = [self.__predict__(sym,stream) for sym in requires]
-            except SyntaxError,syntax_error:
-                raise syntax_error
-                
-            return action(self,*args)
-        dct['__predict__'] = __predict__
+class lazy(object):
+    """A placeholder for an attribute of a lazy parser class
 
-        # We need to patch the predict table so that we use result's
-        # unbound methods, not the trial type's methods
-        result = super(ParserType,meta).__new__(meta,name,bases,dct)
-        for sym,predictions in result.__predict_table__.iteritems():
-            for terminal,(badmethod,args) in predictions.items():
-                goodmethod = getattr(result,badmethod.__name__)
-                predictions[terminal] = (goodmethod,args)
-        return result
+    Reading it compiles the class (see ParserType.__compile__), which
+    replaces every placeholder with the real thing."""
+
+    def __init__(self,name):
+        self.name = name
+        return
+
+    def __get__(self,obj,cls):
+        # We may be a placeholder in a base class of cls, so compile
+        # the class that actually holds us
+        for owner in cls.__mro__:
+            if owner.__dict__.get(self.name) is self: break
+        owner.__compile__()
+        if obj is None: return getattr(cls,self.name)
+        return getattr(obj,self.name)
 
 class Parser(object):
     __metaclass__ = ParserType
 
+    # The lookahead token, kept for each parse (see context)
+    __current_token__ = current_token
+
+    def __incremental__(self,source):
+        "Parse source so it can be edited and reparsed (see incremental.Parse)"
+        return incremental.parse(self,source)
+
+    def __push__(self,filename='<string>'):
+        "A parser to feed text a chunk at a time (see push.PushParser)"
+        return push.PushParser(self,filename)
+
+    def __recover__(self,source):
+        "Parse source past syntax errors, returning (result,errors) (see recovery)"
+        return recovery.parse(self,source)
+
+    def __events__(self,*args,**kwargs):
+        "Parse without actions, yielding (event,value) pairs (see events)"
+        return events.events(self,*args,**kwargs)
+
+    def __validate__(self,source):
+        "True if source parses, otherwise a false Invalid (see validate)"
+        return validate.validate(self,source)
+
 class WhiteSpace(object):
     ignore_whitespace = re.compile(r'[ \t\n]')
 
@@ -258,7 +598,7 @@ class PoundComment(object):
     ignore_poundcomment = re.compile(r'#.*')
 
 class CComment(object):
-    ignore_ccoment = re.compile(r'\/\*.*\*\/',re.DOTALL)
+    ignore_ccoment = re.compile(r'\/\*.*?\*\/',re.DOTALL)
 
 class CxxComment(CComment):
     ignore_cxxcoment = re.compile(r'//.*')
@@ -0,0 +1,190 @@
+"""Push parsing of input that arrives a piece at a time
+
+A PushParser is fed chunks of text (from a socket, say) and lexes and
+parses as far as it can with what it has, keeping the parse stack
+between chunks.  Syntax errors are raised as soon as they are seen.
+
+    push = Calc().__push__()
+    for chunk in chunks:
+        push.feed(chunk)
+    print push.close()
+
+A token is only made once the next chunk can't change it, that is
+once no pattern that could start there can still match on to the
+end of what we have (see Lexer.settled).  So a number 1 waits in case
+the next chunk makes it 1.5, and a / waits while it might start an
+unfinished /* comment.  Actions are called in the same order and with
+the same arguments as the other engines.
+
+parse_reader does the same for an asyncio StreamReader.  It is a
+generator based coroutine in the trollius style, as Python 2 has no
+asyncio of its own.
+"""
+
+from lexer import Text,Token
+from engine import expected_terminal,no_prediction,sequence_loops
+from context import Context
+
+class PushParser(object):
+    "Lex and parse chunks of text as they arrive"
+
+    def __init__(self,parser,filename='<string>'):
+        cls = type(parser)
+        if cls.__predict_table__ is None:
+            raise ValueError('{0} has no predict table to push parse with'.format(cls.__name__))
+        self.parser = parser
+        self.lexer = cls.__lexer__
+        self.text = Text('',filename)
+        self.offset = 0
+        self.closed = False
+        self.done = False
+        self.result = None
+        self.context = Context(parser)
+
+        self.__terminals = cls.__terminals__
+        self.__table = cls.__predict_table__
+        self.__loops = sequence_loops(cls)
+        self.__symbol = cls.__grammar__.start
+        self.__stack = []
+        return
+
+    def feed(self,chunk):
+        """Lex and parse a chunk of text (a str, unicode or bytes)
+
+        Returns True once the parse is done.  Text after the end of
+        the parse is ignored."""
+        if self.closed:
+            raise ValueError('feed after close')
+        if chunk and not self.done:
+            self.__extend(chunk)
+            with self.context: self.__run()
+        return self.done
+
+    def close(self):
+        "Finish the input and return the result of the parse"
+        if not self.closed:
+            self.closed = True
+            if not self.done:
+                with self.context: self.__run()
+        return self.result
+
+    def __extend(self,chunk):
+        # Like the lexer's window, we drop the lines before the offset,
+        # or all the text before it once that's more than a window
+        # (tokens keep their own Text, so their lines stay right)
+        text = self.text
+        local = self.offset-text.base
+        cut = text.source.rfind('\n',0,local)+1
+        if cut == 0 and local > self.lexer.window: cut = local
+        self.text = Text(text.source[cut:]+chunk,text.filename,text.base+cut,
+                         text.lineno(text.base+cut),text.column(text.base+cut))
+        return
+
+    def __run(self):
+        "Push every token we can make from the text we have"
+        lexer = self.lexer
+        eofsym = lexer.eofsym
+        text = self.text
+        source = text.source
+        while not self.done:
+            pos = self.offset-text.base
+
+            # Wait for more if the next chunk could change this token
+            if not self.closed and not lexer.settled(source,pos): break
+
+            m,flavor = lexer.match(source,pos)
+            token = Token(m,flavor,self.offset,text)
+            self.offset += len(m)
+            if flavor.startswith('ignore'): continue
+            self.__push(token)
+            if flavor == eofsym and not self.done:
+                # Nothing left to push, but maybe the start symbol
+                # wants more than one eof (as the lexer would give)
+                while not self.done: self.__push(token)
+        return
+
+    def __push(self,token):
+        """Work the parse stack on with the next token
+
+        Returns once the token is consumed or the parse is done.  As
+        in the iterative engine, each stack entry is a rule being
+        expanded (or a sequence body, with no action)."""
+        parser = self.parser
+        context = self.context
+        terminals = self.__terminals
+        table = self.__table
+        loops = self.__loops
+        stack = self.__stack
+        symbol = self.__symbol
+
+        while 1:
+            if symbol is not None:
+                # Expand a non-terminal onto the stack
+                predictions = table[symbol]
+                prediction = predictions.get(token.flavor)
+                if prediction is None:
+                    context.token = token
+                    raise no_prediction(symbol,predictions,token)
+                if symbol in loops:
+                    stack.append((None,symbol,[]))
+                else:
+                    action,requires = prediction
+                    stack.append((action,requires,[]))
+
+            # Work down the stack until we need another expansion
+            while 1:
+                action,requires,args = stack[-1]
+                n = len(args)
+                if action is not None:
+                    symbol = requires[n] if n < len(requires) else None
+                else:
+                    # requires is the body of a sequence
+                    element,sep,tail,more = loops[requires]
+                    if n == 0:
+                        symbol = element
+                    elif sep is not None and n%2 == 0:
+                        if token.flavor not in table[requires]:
+                            context.token = token
+                            raise no_prediction(requires,table[requires],token)
+                        symbol = element
+                    elif token.flavor in more:
+                        symbol = element if sep is None else sep
+                    elif token.flavor in table[tail]:
+                        symbol = None
+                    else:
+                        context.token = token
+                        raise no_prediction(tail,table[tail],token)
+
+                if symbol is not None:
+                    if symbol not in terminals: break
+                    if token.flavor != symbol:
+                        context.token = token
+                        raise expected_terminal(symbol,token)
+                    # Consumed, so wait for the next token
+                    args.append(token)
+                    self.__symbol = None
+                    return
+
+                # All arguments are in place, so reduce
+                stack.pop()
+                context.token = token
+                value = args if action is None else action(parser,*args)
+                if not stack:
+                    self.result = value
+                    self.done = True
+                    return
+                stack[-1][2].append(value)
+
+def parse_reader(parser,reader,size=1<<16):
+    """A coroutine parsing what an asyncio StreamReader reads
+
+    Written for trollius (asyncio for Python 2); run it in a Task or
+    with loop.run_until_complete.  Stops reading once the parse is
+    done."""
+    import trollius
+    push = PushParser(parser,getattr(reader,'name','<stream>'))
+    while not push.done:
+        chunk = yield trollius.From(reader.read(size))
+        if not chunk: break
+        push.feed(chunk)
+    raise trollius.Return(push.close())
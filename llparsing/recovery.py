@@ -0,0 +1,110 @@
+"""Parsing that carries on after syntax errors
+
+Parse errors are recovered from in panic mode: a non-terminal that
+can't be expanded skips tokens until one it can expand with, or one
+in its follow set (when it gives up, leaving the token to whatever
+comes after it).  A missing terminal is taken as read.  All the
+errors found are returned with what could be made of the input.
+
+    result,errors = Calc().__recover__('1 + * 2 + (3')
+    for error in errors:
+        print error
+
+Only the first of a run of errors is reported, until a token is
+matched again, as the rest are usually knock-on effects of it.
+
+Actions are called with None for whatever couldn't be parsed.  If
+such an action raises an exception its value is None too, so the
+result holds everything that did parse.
+"""
+
+from engine import expected_terminal,no_prediction,sequence_loops
+from context import Context
+
+def parse(parser,source):
+    "The result of parsing source and a list of the SyntaxErrors found"
+    cls = type(parser)
+    G = cls.__grammar__
+    if G is None:
+        raise ValueError('{0} has no grammar to recover with'.format(cls.__name__))
+    table = cls.__predict_table__
+    terminals = cls.__terminals__
+    follow = G.follow
+    eof = cls.__eof__
+    loops = sequence_loops(cls)
+    stream = cls.__lexer__(source)
+
+    errors = []
+    context = Context(parser)
+    # The lookahead token, whether we are recovering from an error
+    # and how many errors there have been (reported or not)
+    state = [next(stream),False,0]
+
+    def report(error):
+        if not state[1]: errors.append(error)
+        state[1] = True
+        state[2] += 1
+        return
+
+    def sync(symbol,wanted):
+        "Skip to a token in wanted (True) or symbol's follow (False)"
+        stop = follow.get(symbol) or ()
+        token = state[0]
+        while token.flavor not in wanted:
+            if token.flavor in stop or token.flavor == eof: return False
+            token = state[0] = next(stream)
+        return True
+
+    def predict(symbol):
+        token = state[0]
+        if symbol in terminals:
+            if token.flavor != symbol:
+                context.token = token
+                report(expected_terminal(symbol,token))
+                return None
+            state[0] = next(stream)
+            state[1] = False
+            return token
+
+        predictions = table[symbol]
+        if token.flavor not in predictions:
+            context.token = token
+            report(no_prediction(symbol,predictions,token))
+            if not sync(symbol,predictions): return None
+            token = state[0]
+
+        failures = state[2]
+        if symbol in loops:
+            element,sep,tail,more = loops[symbol]
+            tails = table[tail]
+            value = []
+            while 1:
+                value.append(predict(element))
+                token = state[0]
+                if token.flavor not in more:
+                    if token.flavor in tails: break
+                    context.token = token
+                    report(no_prediction(tail,tails,token))
+                    if not sync(tail,more): break
+                if sep is not None:
+                    value.append(predict(sep))
+                    token = state[0]
+                    if token.flavor not in predictions:
+                        context.token = token
+                        report(no_prediction(symbol,predictions,token))
+                        if not sync(symbol,predictions): break
+            return value
+
+        action,requires = predictions[token.flavor]
+        args = [predict(sym) for sym in requires]
+        context.token = state[0]
+        if state[2] == failures:
+            return action(parser,*args)
+        try:
+            return action(parser,*args)
+        except Exception:
+            return None
+
+    with context:
+        result = predict(G.start)
+    return result,errors
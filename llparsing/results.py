@@ -0,0 +1,124 @@
+"""A cache of parse results, keyed by the input's content
+
+A parser class opts in with a __results__ attribute: True, or a dict
+of ResultCache options.  The class then gets a ResultCache of its own
+in place of the setting:
+
+    class Config(Parser):
+        __results__ = {'count' : 1000,'directory' : True}
+        ...
+
+    Config().__parse__(text)      # lexed and parsed
+    Config().__parse__(text)      # the same result, from the cache
+    print Config.__results__.stats()
+
+Only __parse__ of a single string is cached.  A repeated input gets
+back the very object parsed the first time, so results should not be
+changed by whoever gets them.  Inputs that raise errors aren't cached.
+
+With a directory (a name, or True as for __cache__) the token streams
+of parsed inputs are also kept on disk as TokenArrays.  An input that
+misses in memory but hits on disk skips lexing and is only parsed.
+"""
+
+import hashlib,threading
+from collections import OrderedDict
+import cache
+
+class ResultCache(object):
+    """The parse results of recently parsed inputs
+
+    At most count results are kept, for inputs of at most size
+    characters in all.  When either limit is passed, the least
+    recently used results go first."""
+
+    def __init__(self,count=1024,size=1<<24,directory=None):
+        self.count = count
+        self.size = size
+        self.directory = directory and cache.directory(directory)
+        self.grammar = ''
+        self.__entries = OrderedDict()
+        self.__held = 0
+        self.__lock = threading.Lock()
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+        return
+
+    def settings(self):
+        "Options to make another cache like this one"
+        return {'count' : self.count,'size' : self.size,'directory' : self.directory}
+
+    def key(self,source):
+        "The key of a string input, which covers the grammar too"
+        if isinstance(source,unicode): source = source.encode('utf-8')
+        return hashlib.sha1(self.grammar+'\0'+source).hexdigest()
+
+    def get(self,key):
+        "The (True,result) cached under key, or (False,None)"
+        with self.__lock:
+            entry = self.__entries.pop(key,None)
+            if entry is None:
+                self.misses += 1
+                return False,None
+            self.__entries[key] = entry
+            self.hits += 1
+            return True,entry[0]
+
+    def put(self,key,result,size):
+        "Cache result for an input of size characters"
+        with self.__lock:
+            old = self.__entries.pop(key,None)
+            if old is not None: self.__held -= old[1]
+            self.__entries[key] = (result,size)
+            self.__held += size
+            while self.__entries and (len(self.__entries) > self.count or
+                                      self.__held > self.size):
+                _,(_,dropped) = self.__entries.popitem(last=False)
+                self.__held -= dropped
+                self.evictions += 1
+        return
+
+    def clear(self):
+        "Forget every cached result (but not the statistics)"
+        with self.__lock:
+            self.__entries.clear()
+            self.__held = 0
+        return
+
+    def tokens(self,lexer,key,source):
+        "The TokenArray for source, from disk if we saved it before"
+        saved = cache.load(self.directory,'tokens-'+key)
+        if saved is not None:
+            self.disk_hits += 1
+            return saved['tokens']
+        tokens = lexer.compact(source)
+        cache.save(self.directory,'tokens-'+key,{'tokens' : tokens})
+        return tokens
+
+    def stats(self):
+        "Hit and miss counts and what the cache holds"
+        return {
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'disk_hits' : self.disk_hits,
+            'evictions' : self.evictions,
+            'count' : len(self.__entries),
+            'size' : self.__held,
+            }
+
+def cached(parse,results):
+    "A __parse__ method that looks in results before calling parse"
+    def __parse__(self,*args,**kwargs):
+        if len(args) != 1 or kwargs or not isinstance(args[0],basestring):
+            return parse(self,*args,**kwargs)
+        source = args[0]
+        key = results.key(source)
+        hit,result = results.get(key)
+        if hit: return result
+        if results.directory is not None:
+            result = parse(self,results.tokens(self.__lexer__,key,source))
+        else:
+            result = parse(self,source)
+        results.put(key,result,len(source))
+        return result
+    __parse__.__doc__ = parse.__doc__
+    return __parse__
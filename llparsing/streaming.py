@@ -0,0 +1,124 @@
+"""Parsing a long run of top-level items one item at a time
+
+A parser class that names a non-terminal of its start rule as
+__streamed__ parses to a generator of that non-terminal's items:
+
+    class Script(Parser):
+        __streamed__ = 'stmts'
+
+        def start(self,stmts,eof): ...
+
+        @sequence
+        def stmts(self,stmt): ...
+
+    for value in Script().__parse__(open('huge.script')):
+        ...
+
+Each item's value is yielded as soon as it is parsed, and nothing
+keeps it after that, so memory is bounded by the largest item rather
+than the whole input.  The streamed non-terminal is a @sequence (its
+separators are parsed but not yielded) or repeats as X -> item X with
+an empty X -> rule.  It must be in every start rule.  The other
+symbols of the start rule are parsed as usual, but the actions of the
+start rule and of the streamed non-terminal are never called, as the
+list they would take is never made.
+
+Syntax errors are raised by the generator when it gets to them, after
+the items before them have been yielded.
+"""
+
+from engine import no_prediction,sequence_loops
+from context import Context
+
+def plan(cls):
+    """How to stream cls's parses, worked out once per class
+
+    That is (symbol,splits,loop) with splits mapping each flavor the
+    start rules are predicted by to the symbols (before,after) the
+    streamed one, and loop (body,element,sep,tail,more) for a
+    @sequence or None for a repeated non-terminal."""
+    try:
+        return cls.__dict__['__stream_plan__']
+    except KeyError:
+        pass
+    table = cls.__predict_table__
+    if table is None:
+        raise ValueError('{0} has no predict table to stream with'.format(cls.__name__))
+    symbol = cls.__streamed__
+    if symbol not in table:
+        raise ValueError('{0} has no non-terminal {1!r} to stream'.format(cls.__name__,symbol))
+
+    start = cls.__grammar__.start
+    splits = {}
+    for flavor,(action,requires) in table[start].iteritems():
+        if symbol not in requires:
+            raise ValueError('{0} is not in every {1} rule of {2}'.format(symbol,start,cls.__name__))
+        i = list(requires).index(symbol)
+        splits[flavor] = (requires[:i],requires[i+1:])
+
+    body = symbol+'_body'
+    loops = sequence_loops(cls)
+    if body in loops:
+        element,sep,tail,more = loops[body]
+        loop = (body,element,sep,tail,more)
+    else:
+        loop = None
+        for action,requires in table[symbol].itervalues():
+            if requires and (len(requires) != 2 or requires[1] != symbol):
+                raise ValueError('{0} must be a @sequence or {0} -> item {0} with an empty {0} ->'.format(symbol))
+
+    cls.__stream_plan__ = result = (symbol,splits,loop)
+    return result
+
+def items(parser,*args,**kwargs):
+    "Lex and parse (as __parse__ does), yielding the streamed items' values"
+    cls = type(parser)
+    symbol,splits,loop = plan(cls)
+    table = cls.__predict_table__
+    predict = parser.__predict__
+    context = Context(parser,parser.__lexer__(*args,**kwargs))
+
+    # The context is only entered while we parse, never across a
+    # yield, as the consumer may do anything (in any thread) then
+    with context:
+        start = cls.__grammar__.start
+        split = splits.get(context.token.flavor)
+        if split is None:
+            raise no_prediction(start,table[start],context.token)
+        before,after = split
+        for sym in before: predict(sym,context)
+        predictions = table[symbol]
+        if context.token.flavor not in predictions:
+            raise no_prediction(symbol,predictions,context.token)
+
+    if loop is None:
+        while 1:
+            with context:
+                prediction = predictions.get(context.token.flavor)
+                if prediction is None:
+                    raise no_prediction(symbol,predictions,context.token)
+                requires = prediction[1]
+                if not requires: break
+                value = predict(requires[0],context)
+            yield value
+    else:
+        body,element,sep,tail,more = loop
+        predictions = table[body]
+        tails = table[tail]
+        done = False
+        while not done:
+            with context:
+                if context.token.flavor not in predictions:
+                    raise no_prediction(body,predictions,context.token)
+                value = predict(element,context)
+                flavor = context.token.flavor
+                if flavor not in more:
+                    if flavor not in tails:
+                        raise no_prediction(tail,tails,context.token)
+                    done = True
+                elif sep is not None:
+                    predict(sep,context)
+            yield value
+
+    with context:
+        for sym in after: predict(sym,context)
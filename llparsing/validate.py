@@ -0,0 +1,128 @@
+"""Checking input against a grammar without parsing it
+
+    if not Calc().__validate__(source):
+        ...
+
+__validate__ lexes and runs the (dense) predict table with a stack
+of symbol codes.  It makes no tokens, calls no actions and does no
+line or column work.  It returns True, or an Invalid (which is
+false) whose error is the SyntaxError __parse__ would have raised,
+built only when asked for.
+"""
+
+from lexer import Text,Token
+from engine import expected_terminal,no_prediction,dense_table
+
+IGNORE = -1
+
+class Invalid(object):
+    "Why an input failed to validate"
+
+    def __init__(self,parser,symbol,match,flavor,offset,source,filename):
+        self.parser = parser
+        self.symbol = symbol
+        self.match = match
+        self.flavor = flavor
+        self.offset = offset
+        self.source = source
+        self.filename = filename
+        self.__error = None
+        return
+
+    def __nonzero__(self):
+        return False
+
+    @property
+    def token(self):
+        "The token validation stopped at"
+        return Token(self.match,self.flavor,self.offset,Text(self.source,self.filename))
+
+    @property
+    def error(self):
+        "The SyntaxError for the failure"
+        if self.__error is None:
+            cls = type(self.parser)
+            token = self.token
+            if self.symbol in cls.__terminals__:
+                self.__error = expected_terminal(self.symbol,token)
+            else:
+                self.__error = no_prediction(self.symbol,cls.__predict_table__[self.symbol],token)
+        return self.__error
+
+    def __str__(self):
+        return str(self.error)
+
+def recognizer(cls):
+    """The (flavor codes,expansions) validate runs with, made once per class
+
+    Flavor codes are the terminal codes, with IGNORE for flavors the
+    lexer skips.  Expansions is the dense table's rows with each
+    entry replaced by its requires codes, reversed for the stack."""
+    try:
+        return cls.__dict__['__recognizer__']
+    except KeyError:
+        pass
+    coded = dense_table(cls)
+    if coded is None:
+        raise ValueError('{0} has no predict table to validate with'.format(cls.__name__))
+    codes = dict( (flavor,i) for i,flavor in
+                  enumerate(coded.symbols[:coded.nterminals]) )
+    lexer = cls.__lexer__
+    for flavor in getattr(lexer,'patterns',()):
+        if flavor.startswith('ignore'): codes[flavor] = IGNORE
+    expansions = [None if entry is None else entry[1][::-1]
+                  for entry in coded.rows]
+    cls.__recognizer__ = result = (codes,expansions)
+    return result
+
+def validate(parser,source):
+    "True if source is in parser's language, otherwise an Invalid"
+    cls = type(parser)
+    codes,expansions = recognizer(cls)
+    coded = dense_table(cls)
+    nterminals = coded.nterminals
+    width = coded.width
+    lexer = cls.__lexer__
+    matches = lexer.matcher()
+    choose = lexer.choose
+    eofsym = lexer.eofsym
+    filename = getattr(source,'name','<string>')
+    read = getattr(source,'read',None)
+    if read is not None: source = read()
+    end = len(source)
+
+    pos = 0
+    stack = [coded.codes[cls.__grammar__.start]]
+    pop = stack.pop
+    extend = stack.extend
+    m = None
+    while stack:
+        # Lex the next token we don't ignore (its text is m)
+        if m is None:
+            while 1:
+                good_matches = matches(source,pos)
+                if len(good_matches) == 1:
+                    m,flavor = good_matches[0]
+                elif good_matches:
+                    m,flavor = choose(good_matches)
+                elif pos < end:
+                    m = source[pos]
+                    flavor = '_%03o'%ord(m)
+                else:
+                    m,flavor = '',eofsym
+                code = codes.get(flavor,nterminals)
+                if code != IGNORE: break
+                pos += len(m)
+
+        s = pop()
+        if s < nterminals:
+            if s != code:
+                return Invalid(parser,coded.symbols[s],m,flavor,pos,source,filename)
+            pos += len(m)
+            m = None
+        else:
+            expansion = expansions[(s-nterminals)*width+code]
+            if expansion is None:
+                return Invalid(parser,coded.symbols[s],m,flavor,pos,source,filename)
+            extend(expansion)
+    return True